@@ -1,19 +1,23 @@
 from flask import Flask
 from config import Config
-from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_avatars import Avatars
 from flask_login import LoginManager
 from flask_moment import Moment
+from app.instrumentation import Instrumentation
+from app.sqlite import SQLiteTuning
+from app.replicas import RoutingSQLAlchemy
 
 app = Flask(__name__)
 app.config.from_object(Config)
-db = SQLAlchemy(app)
+db = RoutingSQLAlchemy(app)
+sqlite_tuning = SQLiteTuning(app)
 avatars = Avatars(app)
 migrate = Migrate(app, db)
 login = LoginManager(app)
 moment = Moment(app)
+instrumentation = Instrumentation(app)
 
 login.login_view = 'login'
 
-from app import routes, models
+from app import routes, models, cli
@@ -0,0 +1,144 @@
+from datetime import datetime
+from sqlalchemy.orm.attributes import set_committed_value
+from app import db
+from app.models import User, Todo, TodoReaction, FeedEntry, insert_or_ignore, increment, get_user, \
+    touch
+from app.events import publish_on_commit
+from app.jobs import defer_timeline, defer_notification
+
+ACTIONS = {}
+TODO_ID = (int, str)
+
+
+class InvalidAction(Exception):
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def action(name, **types):
+    # types maps each argument to the scalar types it accepts, so a batch
+    # from the client is rejected before any of it touches the database.
+    def register(fn):
+        ACTIONS[name] = (fn, types)
+        return fn
+    return register
+
+
+def perform(user, name, args):
+    # Applies one action to the session without committing, so callers can
+    # group several into a single transaction. Returns the changed state.
+    # args comes from the client, so it is passed as a dict rather than as
+    # keywords that could collide with user or name.
+    if not isinstance(name, str) or name not in ACTIONS:
+        raise InvalidAction("unknown action")
+    fn, types = ACTIONS[name]
+    if set(args) != set(types):
+        raise InvalidAction(f"invalid arguments for {name}")
+    for arg, value in args.items():
+        if isinstance(value, bool) or not isinstance(value, types[arg]):
+            raise InvalidAction(f"invalid {arg} for {name}")
+    return fn(user, **args)
+
+
+def _bump(instance, **deltas):
+    # Keeps the loaded instance in step with the in-database increment, so a
+    # later action in the same batch reports the right count.
+    increment(type(instance), instance.id, **deltas)
+    for column, delta in deltas.items():
+        set_committed_value(instance, column, getattr(instance, column) + delta)
+
+
+def _get_todo(todo_id):
+    try:
+        todo = Todo.query.get(int(todo_id))
+    except (TypeError, ValueError, OverflowError):
+        raise InvalidAction("invalid todo id")
+    if todo is None:
+        raise InvalidAction("todo not found", 404)
+    return todo
+
+
+def _get_user(username):
+    user = User.query.filter_by(username=username).first()
+    if user is None:
+        raise InvalidAction("user not found", 404)
+    return user
+
+
+@action('complete', todo_id=TODO_ID)
+def complete(user, todo_id):
+    todo = _get_todo(todo_id)
+    if todo.user_id != user.id:
+        raise InvalidAction("todo not found", 404)
+    if not todo.completed:
+        todo.completed = True
+        todo.completed_at = datetime.utcnow()
+        for owner_id in FeedEntry.fan_out(todo):
+            publish_on_commit(owner_id, 'feed', {'id': todo.id, 'author': user.username})
+        defer_timeline(user, f"Completed task <strong>{todo.title}</strong>", key=f"complete:{todo.id}")
+        touch(user.id)
+    return {'id': todo.id, 'completed': True, 'completed_at': todo.completed_at.isoformat() + 'Z'}
+
+
+@action('like', todo_id=TODO_ID)
+def like(user, todo_id):
+    todo = _get_todo(todo_id)
+    if insert_or_ignore(TodoReaction.__table__, user_id=user.id, todo_id=todo.id):
+        _bump(todo, like_count=1)
+        touch(user.id, todo.user_id)
+        creator = get_user(todo.user_id)
+        if creator != user:
+            defer_notification(creator, user,
+                               "{actor_username} liked your completed task <strong>" + todo.title + "</strong>",
+                               key=f"like:{user.id}:{todo.id}")
+    return {'id': todo.id, 'liked': True, 'like_count': todo.like_count}
+
+
+@action('unlike', todo_id=TODO_ID)
+def unlike(user, todo_id):
+    todo = _get_todo(todo_id)
+    if TodoReaction.query.filter_by(user_id=user.id, todo_id=todo.id).delete():
+        _bump(todo, like_count=-1)
+        touch(user.id, todo.user_id)
+    return {'id': todo.id, 'liked': False, 'like_count': todo.like_count}
+
+
+@action('delete', todo_id=TODO_ID)
+def delete(user, todo_id):
+    todo = _get_todo(todo_id)
+    if todo.user_id != user.id:
+        raise InvalidAction("todo not found", 404)
+    defer_timeline(user, f"Deleted task <strong>{todo.title}</strong>", key=f"delete:{todo.id}")
+    FeedEntry.remove_todo(todo)
+    touch(user.id)
+    db.session.delete(todo)
+    return {'id': todo.id, 'deleted': True}
+
+
+@action('follow', username=str)
+def follow(user, username):
+    followed = _get_user(username)
+    if followed == user:
+        raise InvalidAction("you cannot follow yourself")
+    if user.follow(followed):
+        set_committed_value(followed, 'follower_count', followed.follower_count + 1)
+        touch(user.id, followed.id)
+        defer_timeline(user, f"Followed <strong>{followed.get_full_name()}</strong>",
+                       key=f"follow:{user.id}:{followed.id}")
+        defer_notification(followed, user, "{actor_name} has started following you",
+                           key=f"followed:{user.id}:{followed.id}")
+    return {'username': followed.username, 'following': True, 'follower_count': followed.follower_count}
+
+
+@action('unfollow', username=str)
+def unfollow(user, username):
+    followed = _get_user(username)
+    if followed == user:
+        raise InvalidAction("you cannot unfollow yourself")
+    if user.unfollow(followed):
+        set_committed_value(followed, 'follower_count', followed.follower_count - 1)
+        touch(user.id, followed.id)
+    return {'username': followed.username, 'following': False, 'follower_count': followed.follower_count}
@@ -0,0 +1,127 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+from functools import lru_cache
+from flask import request, send_from_directory, make_response
+from app import app
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+PRIVATE = 'private, no-cache'
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+COMPRESSIBLE = ('.css', '.js', '.svg')
+
+
+@lru_cache(maxsize=256)
+def _file_hash(path, mtime):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:12]
+
+
+def asset_hash(filename):
+    path = os.path.join(app.static_folder, filename)
+    try:
+        return _file_hash(path, os.stat(path).st_mtime)
+    except OSError:
+        return None
+
+
+@app.url_defaults
+def add_asset_version(endpoint, values):
+    # Versioned URLs change whenever the file does, so they can be cached
+    # forever; stale copies are simply never requested again.
+    if endpoint == 'static' and 'filename' in values and 'v' not in values:
+        version = asset_hash(values['filename'])
+        if version is not None:
+            values['v'] = version
+
+
+def _compressed_name(filename, version, suffix):
+    # Named after the source's hash, so an edited file never serves a
+    # compressed copy of its old contents under its new version.
+    return f'{filename}.{version}{suffix}'
+
+
+def _negotiate(filename):
+    accepted = request.accept_encodings
+    version = asset_hash(filename)
+    if version is None:
+        return None, filename
+    for encoding, suffix in ENCODINGS:
+        compressed = _compressed_name(filename, version, suffix)
+        if accepted[encoding] and os.path.isfile(os.path.join(app.static_folder, compressed)):
+            return encoding, compressed
+    return None, filename
+
+
+def serve_static(filename):
+    encoding, served = _negotiate(filename)
+    response = send_from_directory(app.static_folder, served,
+                                   mimetype=mimetypes.guess_type(filename)[0])
+    version = asset_hash(served)
+    if encoding is not None:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    if version is not None:
+        response.set_etag(version)
+    immutable = version is not None and request.args.get('v') == asset_hash(filename)
+    response.headers['Cache-Control'] = IMMUTABLE if immutable else REVALIDATE
+    return response.make_conditional(request)
+
+
+app.view_functions['static'] = serve_static
+
+
+def cache_immutable(response, etag):
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = IMMUTABLE
+    return response.make_conditional(request)
+
+
+def conditional_page(last_modified, render, *variant):
+    # For per-user pages: the browser may keep a copy but must revalidate it,
+    # and shared caches must not store it at all. render is only called when
+    # the client's copy is out of date. Only If-None-Match is honoured:
+    # If-Modified-Since has one-second resolution, and two changes within a
+    # second would answer 304 for the second one.
+    etag = hashlib.sha1(repr((app.config['RELEASE'], last_modified, variant)).encode()).hexdigest()
+    if last_modified is not None and request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+    else:
+        response = make_response(render())
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = PRIVATE
+    response.vary.add('Cookie')
+    return response
+
+
+def compress_static():
+    try:
+        import brotli
+    except ImportError:
+        brotli = None
+
+    written = []
+    for root, _, files in os.walk(app.static_folder):
+        for name in files:
+            if not name.endswith(COMPRESSIBLE):
+                continue
+            path = os.path.join(root, name)
+            with open(path, 'rb') as f:
+                data = f.read()
+            version = _file_hash(path, os.stat(path).st_mtime)
+            current = [_compressed_name(name, version, '.gz')]
+            with open(os.path.join(root, current[0]), 'wb') as f:
+                f.write(gzip.compress(data, 9, mtime=0))
+            if brotli is not None:
+                current.append(_compressed_name(name, version, '.br'))
+                with open(os.path.join(root, current[1]), 'wb') as f:
+                    f.write(brotli.compress(data))
+            for stale in files:
+                if stale.startswith(name + '.') and stale.endswith(('.gz', '.br')) and stale not in current:
+                    os.remove(os.path.join(root, stale))
+            written += [os.path.join(root, compressed) for compressed in current]
+    return written
@@ -0,0 +1,122 @@
+import time
+import click
+from app import app, db
+from app.models import FeedEntry, rebuild_counters
+from app.assets import compress_static
+from app.data import TABLES, import_rows, export_rows
+from app.retention import RETAINED, compact as compact_table
+from app.jobs import run_batch_in_context
+from app.fragments import fragments
+
+
+@app.cli.group()
+def feed():
+    """Materialized feed commands."""
+    pass
+
+
+@feed.command()
+def backfill():
+    """Rebuild every user's feed from the todo and followers tables."""
+    FeedEntry.rebuild()
+    db.session.commit()
+
+
+@app.cli.group()
+def assets():
+    """Static asset commands."""
+    pass
+
+
+@assets.command()
+def compress():
+    """Write precompressed .gz (and .br if brotli is installed) static files."""
+    for path in compress_static():
+        print(path)
+
+
+@app.cli.group()
+def counters():
+    """Denormalized counter commands."""
+    pass
+
+
+@counters.command()
+def rebuild():
+    """Recompute like, follower and following counts from their source tables."""
+    rebuild_counters()
+    db.session.commit()
+
+
+@app.cli.group()
+def data():
+    """Bulk import and export commands."""
+    pass
+
+
+@data.command('import')
+@click.argument('entity', type=click.Choice(list(TABLES)))
+@click.argument('path')
+@click.option('--chunk-size', default=5000)
+@click.option('--rebuild/--no-rebuild', default=True, help='Recompute counters and feeds afterwards.')
+def import_(entity, path, chunk_size, rebuild):
+    """Stream rows from a .jsonl or .csv file into the database."""
+    print(entity, import_rows(entity, path, chunk_size))
+    if rebuild and entity in ('follows', 'reactions', 'todos'):
+        rebuild_counters()
+        FeedEntry.rebuild()
+    db.session.commit()
+
+
+@data.command('export')
+@click.argument('entity', type=click.Choice(list(TABLES)))
+@click.argument('path')
+@click.option('--chunk-size', default=5000)
+def export(entity, path, chunk_size):
+    """Stream rows from the database into a .jsonl or .csv file."""
+    print(entity, export_rows(entity, path, chunk_size))
+
+
+@app.cli.group()
+def retention():
+    """Timeline and notification retention commands."""
+    pass
+
+
+@retention.command()
+@click.option('--archive', 'archive_dir', default=None, help='Append expired rows to gzipped JSONL here first.')
+@click.option('--every', default=0, help='Keep running, compacting every this many seconds.')
+def compact(archive_dir, every):
+    """Delete rows older than their table's retention window in batches."""
+    while True:
+        for name in RETAINED:
+            print(name, compact_table(name, archive_dir))
+        if not every:
+            break
+        time.sleep(every)
+
+
+@app.cli.group()
+def jobs():
+    """Background job queue commands."""
+    pass
+
+
+@jobs.command()
+def work():
+    """Apply queued side-effect jobs in batches until interrupted."""
+    while True:
+        if not run_batch_in_context():
+            time.sleep(app.config['JOB_POLL_INTERVAL'])
+
+
+@app.cli.group('fragments')
+def fragments_():
+    """Rendered fragment cache commands."""
+    pass
+
+
+@fragments_.command()
+def prune():
+    """Delete expired fragments from the filesystem cache."""
+    print('pruned', fragments.prune())
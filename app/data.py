@@ -0,0 +1,106 @@
+import csv
+import json
+from datetime import datetime
+from app import db
+from app.models import User, Todo, TodoReaction, followers
+from app.passwords import hash_password
+
+TABLES = {
+    'users': User.__table__,
+    'todos': Todo.__table__,
+    'follows': followers,
+    'reactions': TodoReaction.__table__,
+}
+
+COLUMNS = {
+    'users': ['id', 'username', 'first_name', 'last_name', 'email', 'bio', 'avatar', 'password_hash'],
+    'todos': ['id', 'user_id', 'title', 'description', 'created_at', 'completed', 'completed_at'],
+    'follows': ['follower_id', 'followed_id'],
+    'reactions': ['todo_id', 'user_id'],
+}
+
+
+def insert_chunked(table, rows, chunk_size):
+    # One executemany per chunk keeps memory flat and round trips low no
+    # matter how many rows the iterable yields. An executemany compiles its
+    # INSERT from the first row's keys, so a row with different keys starts
+    # a new chunk rather than losing its extra fields.
+    batch = []
+    count = 0
+    for row in rows:
+        if batch and row.keys() != batch[0].keys():
+            db.session.execute(table.insert(), batch)
+            count += len(batch)
+            batch = []
+        batch.append(row)
+        if len(batch) >= chunk_size:
+            db.session.execute(table.insert(), batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        db.session.execute(table.insert(), batch)
+        count += len(batch)
+    return count
+
+
+def _read(path):
+    with open(path, newline='') as f:
+        if path.endswith('.csv'):
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def _convert(column, value):
+    if value is None or value == '':
+        return None
+    if isinstance(column.type, db.DateTime) and isinstance(value, str):
+        return datetime.fromisoformat(value)
+    if isinstance(column.type, db.Boolean) and isinstance(value, str):
+        return value.lower() in ('1', 'true', 'yes')
+    if isinstance(column.type, db.Integer):
+        return int(value)
+    return value
+
+
+def _rows(entity, path):
+    table = TABLES[entity]
+    names = COLUMNS[entity]
+    for record in _read(path):
+        # Hashing is the slowest part of an import; pre-hashed input skips it.
+        if entity == 'users' and not record.get('password_hash') and record.get('password'):
+            record['password_hash'] = hash_password(record['password'])
+        yield {name: _convert(table.c[name], record.get(name)) for name in names if name in record}
+
+
+def import_rows(entity, path, chunk_size):
+    table = TABLES[entity]
+    count = insert_chunked(table, _rows(entity, path), chunk_size)
+    if count and 'id' in table.c and db.engine.dialect.name == 'postgresql':
+        # Explicit ids bypass the serial sequence; move it past them so the
+        # app's own inserts don't collide with imported rows.
+        db.session.execute(db.text(f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+                                   f"(SELECT MAX(id) FROM \"{table.name}\"))"))
+    return count
+
+
+def export_rows(entity, path, chunk_size):
+    table = TABLES[entity]
+    names = COLUMNS[entity]
+    query = db.session.query(*[table.c[name] for name in names]) \
+        .order_by(*table.primary_key.columns).yield_per(chunk_size)
+    count = 0
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f) if path.endswith('.csv') else None
+        if writer is not None:
+            writer.writerow(names)
+        for row in query:
+            values = [value.isoformat() if isinstance(value, datetime) else value for value in row]
+            if writer is not None:
+                writer.writerow(values)
+            else:
+                f.write(json.dumps(dict(zip(names, values))) + '\n')
+            count += 1
+    return count
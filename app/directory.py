@@ -0,0 +1,38 @@
+from collections import namedtuple
+from app import app, db
+from app.cache import LRUCache
+from app.models import User
+
+DirectoryEntry = namedtuple('DirectoryEntry', ['id', 'username', 'name', 'avatar'])
+
+
+class UserDirectory(object):
+    # Bounded LRU of prefix-search results. Each worker keeps its own copy, so
+    # entries also expire after a TTL to pick up changes made by other workers.
+
+    def __init__(self, max_entries, ttl):
+        self.cache = LRUCache(max_entries, ttl)
+
+    def search(self, prefix, limit):
+        key = (prefix, limit)
+        entries = self.cache.get(key)
+        if entries is None:
+            entries = self._query(prefix, limit)
+            self.cache.set(key, entries)
+        return entries
+
+    def invalidate(self):
+        self.cache.clear()
+
+    @staticmethod
+    def _query(prefix, limit):
+        # A half-open range on username is a range scan on ix_user_username
+        # on every backend, unlike LIKE which SQLite won't index by default.
+        rows = db.session.query(User.id, User.username, User.first_name, User.last_name, User.avatar) \
+            .filter(User.username >= prefix, User.username < prefix + '\uffff') \
+            .order_by(User.username).limit(limit)
+        return tuple(DirectoryEntry(id=id, username=username, name=f"{first_name} {last_name[0]}", avatar=avatar)
+                     for id, username, first_name, last_name, avatar in rows)
+
+
+directory = UserDirectory(app.config['USER_DIRECTORY_CACHE_SIZE'], app.config['USER_DIRECTORY_TTL'])
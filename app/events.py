@@ -0,0 +1,142 @@
+import json
+import queue
+import threading
+from sqlalchemy import event
+from app import app, db
+
+
+class Subscription(object):
+
+    def __init__(self, channel, maxsize):
+        self.channel = channel
+        self.queue = queue.Queue(maxsize)
+
+    def put(self, message):
+        # A client that stops reading loses messages instead of growing the
+        # queue without bound.
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            pass
+
+    def get(self, timeout):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class Broker(object):
+    # Carries published messages to the hub of every worker. Subclasses only
+    # need to implement publish and call self.dispatch for each delivery.
+
+    def start(self, dispatch):
+        self.dispatch = dispatch
+
+    def publish(self, channel, name, data):
+        raise NotImplementedError
+
+
+class LocalBroker(Broker):
+
+    def publish(self, channel, name, data):
+        self.dispatch(channel, name, data)
+
+
+class RedisBroker(Broker):
+    key = 'sodo:events'
+
+    def __init__(self, url):
+        import redis
+        self.redis = redis.Redis.from_url(url)
+
+    def start(self, dispatch):
+        super().start(dispatch)
+        pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(self.key)
+        threading.Thread(target=self._listen, args=(pubsub,), daemon=True).start()
+
+    def _listen(self, pubsub):
+        for message in pubsub.listen():
+            payload = json.loads(message['data'])
+            self.dispatch(payload['channel'], payload['name'], payload['data'])
+
+    def publish(self, channel, name, data):
+        self.redis.publish(self.key, json.dumps({'channel': channel, 'name': name, 'data': data}))
+
+
+class Hub(object):
+
+    def __init__(self, broker, queue_size):
+        self.broker = broker
+        self.queue_size = queue_size
+        self._subscriptions = {}
+        self._lock = threading.Lock()
+        broker.start(self.dispatch)
+
+    def subscribe(self, channel):
+        subscription = Subscription(channel, self.queue_size)
+        with self._lock:
+            self._subscriptions.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.channel, set())
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                self._subscriptions.pop(subscription.channel, None)
+
+    def dispatch(self, channel, name, data):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(channel, ()))
+        for subscription in subscriptions:
+            subscription.put((name, data))
+
+    def publish(self, channel, name, data):
+        self.broker.publish(channel, name, data)
+
+
+def create_broker(config):
+    if config['EVENT_BROKER'] == 'redis':
+        return RedisBroker(config['EVENT_BROKER_URL'])
+    return LocalBroker()
+
+
+hub = Hub(create_broker(app.config), app.config['EVENT_QUEUE_SIZE'])
+
+
+def publish_on_commit(channel, name, data):
+    # Messages are held on the session until its transaction commits so that
+    # clients never hear about rows that were rolled back.
+    db.session.info.setdefault('pending_events', []).append((channel, name, data))
+
+
+@event.listens_for(db.session, 'after_commit')
+def _publish_pending(session):
+    for channel, name, data in session.info.pop('pending_events', []):
+        hub.publish(channel, name, data)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_pending(session):
+    session.info.pop('pending_events', None)
+
+
+def format_event(name, data):
+    return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+
+
+def stream(channel):
+    subscription = hub.subscribe(channel)
+    keepalive = app.config['EVENT_KEEPALIVE']
+    try:
+        yield 'retry: 5000\n\n'
+        while True:
+            message = subscription.get(timeout=keepalive)
+            if message is None:
+                yield ': keepalive\n\n'
+            else:
+                yield format_event(*message)
+    finally:
+        hub.unsubscribe(subscription)
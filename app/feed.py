@@ -0,0 +1,71 @@
+from collections import namedtuple
+from datetime import datetime
+from itsdangerous import URLSafeSerializer, BadSignature
+from app import app, db
+from app.models import TodoReaction, get_users
+from app.images import avatar_url
+
+FeedItem = namedtuple('FeedItem', ['todo', 'creator', 'liked'])
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def build_feed(viewer, todos):
+    # Resolve creators and the viewer's likes for the whole page up front so
+    # rendering a feed costs the same number of queries regardless of its size.
+    todos = list(todos)
+    if not todos:
+        return []
+
+    creators = get_users(todo.user_id for todo in todos)
+
+    todo_ids = [todo.id for todo in todos]
+    liked = {todo_id for todo_id, in db.session.query(TodoReaction.todo_id)
+             .filter(TodoReaction.user_id == viewer.id, TodoReaction.todo_id.in_(todo_ids))}
+
+    return [FeedItem(todo=todo, creator=creators[todo.user_id], liked=todo.id in liked) for todo in todos]
+
+
+def _cursor_serializer():
+    return URLSafeSerializer(app.config['SECRET_KEY'], salt='feed-cursor')
+
+
+def encode_cursor(todo):
+    return _cursor_serializer().dumps([todo.completed_at.isoformat(), todo.id])
+
+
+def decode_cursor(cursor):
+    try:
+        completed_at, todo_id = _cursor_serializer().loads(cursor)
+        return datetime.fromisoformat(completed_at), int(todo_id)
+    except (BadSignature, TypeError, ValueError):
+        raise InvalidCursor(cursor)
+
+
+def get_feed_page(viewer, cursor=None, per_page=None):
+    # Keyset pagination on (completed_at, id): every page is a bounded range
+    # scan of feed_entry's key instead of an ever-growing OFFSET.
+    per_page = per_page or app.config['FEED_PAGE_SIZE']
+    before = decode_cursor(cursor) if cursor else None
+    todos = viewer.get_feed(before=before, limit=per_page + 1)
+    next_cursor = encode_cursor(todos[per_page - 1]) if len(todos) > per_page else None
+    return build_feed(viewer, todos[:per_page]), next_cursor
+
+
+def serialize_feed_item(item):
+    return {
+        'id': item.todo.id,
+        'title': item.todo.title,
+        'description': item.todo.description,
+        'completed_at': item.todo.completed_at.isoformat(),
+        'liked': item.liked,
+        'like_count': item.todo.like_count,
+        'creator': {
+            'id': item.creator.id,
+            'username': item.creator.username,
+            'name': item.creator.get_formatted_name(),
+            'avatar': avatar_url(item.creator.avatar),
+        },
+    }
@@ -0,0 +1,171 @@
+import hashlib
+import os
+import tempfile
+import time
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+from sqlalchemy import event
+from app import app, db
+from app.cache import LRUCache
+
+
+class MemoryBackend(object):
+    # Per-worker; evicts least recently used fragments beyond max_entries.
+
+    def __init__(self, max_entries):
+        self.cache = LRUCache(max_entries, 0)
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, value, ttl):
+        self.cache.set(key, value, ttl)
+
+    def delete(self, key):
+        self.cache.delete(key)
+
+    def prune(self):
+        # Expired entries are dropped when next read or evicted.
+        return 0
+
+
+class FileSystemBackend(object):
+    # Shared by every worker on the host. Fragments are written to a
+    # temporary file and renamed into place, so readers never see half of one.
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.path, hashlib.sha1(key.encode()).hexdigest())
+
+    def get(self, key):
+        try:
+            with open(self._path(key), encoding='utf-8') as f:
+                if float(f.readline()) <= time.time():
+                    return None
+                return f.read()
+        except (OSError, ValueError):
+            return None
+
+    def set(self, key, value, ttl):
+        fd, temporary = tempfile.mkstemp(dir=self.path)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(f'{time.time() + ttl}\n')
+            f.write(value)
+        os.replace(temporary, self._path(key))
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def prune(self):
+        removed = 0
+        for name in os.listdir(self.path):
+            path = os.path.join(self.path, name)
+            try:
+                with open(path, encoding='utf-8') as f:
+                    expired = float(f.readline()) <= time.time()
+            except (OSError, ValueError):
+                expired = True
+            if expired:
+                try:
+                    os.remove(path)
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+        return removed
+
+
+def create_backend(config):
+    if config['FRAGMENT_CACHE'] == 'filesystem':
+        return FileSystemBackend(config['FRAGMENT_CACHE_DIR'])
+    if config['FRAGMENT_CACHE'] == 'memory':
+        return MemoryBackend(config['FRAGMENT_CACHE_SIZE'])
+    return None
+
+
+def fragment_key(key):
+    if isinstance(key, (tuple, list)):
+        return ':'.join(str(part) for part in key)
+    return str(key)
+
+
+class FragmentCache(object):
+
+    def __init__(self, backend, default_ttl):
+        self.backend = backend
+        self.default_ttl = default_ttl
+
+    def render(self, key, ttl, render, version=None):
+        # The version is stored with the fragment and must match on read.
+        # invalidate() only reaches this process's memory backend, so
+        # fragments that other processes change (a notification applied by
+        # the job worker, say) are versioned by a watermark from the database.
+        if self.backend is None:
+            return render()
+        key = fragment_key(key)
+        version = '' if version is None else str(version)
+        cached = self.backend.get(key)
+        if cached is not None:
+            cached_version, html = cached.split('\n', 1)
+            if cached_version == version:
+                return Markup(html)
+        html = str(render())
+        self.backend.set(key, f'{version}\n{html}', ttl or self.default_ttl)
+        return Markup(html)
+
+    def invalidate(self, *key):
+        if self.backend is None:
+            return
+        # Dropped once the transaction commits; dropping it earlier would let
+        # a concurrent request cache the fragment again from the old rows.
+        db.session.info.setdefault('stale_fragments', set()).add(fragment_key(key))
+
+    def prune(self):
+        return self.backend.prune() if self.backend is not None else 0
+
+
+class FragmentCacheExtension(Extension):
+    # {% cache key[, ttl][, version=...] %}...{% endcache %}, where key is a
+    # string or a tuple of parts. Keys must include everything the body
+    # varies on, apart from what the version covers.
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        kwargs = []
+        while parser.stream.skip_if('comma'):
+            if parser.stream.current.type == 'name' and parser.stream.look().type == 'assign':
+                name = next(parser.stream).value
+                next(parser.stream)
+                kwargs.append(nodes.Keyword(name, parser.parse_expression()))
+            else:
+                args.append(parser.parse_expression())
+        if len(args) == 1:
+            args.append(nodes.Const(None))
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        return nodes.CallBlock(self.call_method('_render', args, kwargs), [], [], body).set_lineno(lineno)
+
+    def _render(self, key, ttl, caller, version=None):
+        return fragments.render(key, ttl, caller, version)
+
+
+fragments = FragmentCache(create_backend(app.config), app.config['FRAGMENT_CACHE_TTL'])
+app.jinja_env.add_extension(FragmentCacheExtension)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _drop_stale(session):
+    for key in session.info.pop('stale_fragments', ()):
+        fragments.backend.delete(key)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _keep_fresh(session):
+    session.info.pop('stale_fragments', None)
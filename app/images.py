@@ -0,0 +1,127 @@
+import hashlib
+import os
+import re
+import secrets
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from flask import url_for, has_request_context
+from PIL import Image, ImageOps
+from app import app
+
+ALLOWED_FORMATS = {'JPEG', 'PNG', 'WEBP', 'GIF'}
+DEFAULT_AVATAR_SIZES = {'small': 'm', 'large': 'l'}
+RENDITION_PATTERN = re.compile(r'^([0-9a-f]{32})_([a-z]+)\.([a-z]+)$')
+
+_executor = None
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+def _get_executor():
+    # Under gevent workers the threading module is patched into greenlets,
+    # which would run Pillow on the event loop; use gevent's real threads there.
+    global _executor
+    if _executor is None:
+        workers = app.config['AVATAR_WORKERS']
+        try:
+            from gevent import monkey
+            from gevent.threadpool import ThreadPoolExecutor as GeventThreadPoolExecutor
+        except ImportError:
+            _executor = ThreadPoolExecutor(workers)
+        else:
+            if monkey.is_module_patched('threading'):
+                _executor = GeventThreadPoolExecutor(workers)
+            else:
+                _executor = ThreadPoolExecutor(workers)
+    return _executor
+
+
+def rendition_name(digest, rendition):
+    return f"{digest}_{rendition}.{app.config['AVATAR_FORMAT'].lower()}"
+
+
+def _decode(data):
+    try:
+        with Image.open(BytesIO(data)) as image:
+            image.verify()
+            image_format = image.format
+    except (OSError, SyntaxError, ValueError, Image.DecompressionBombError):
+        raise InvalidImage()
+    if image_format not in ALLOWED_FORMATS:
+        raise InvalidImage()
+
+
+def store_avatar(file):
+    data = file.read(app.config['AVATAR_MAX_BYTES'] + 1)
+    if len(data) > app.config['AVATAR_MAX_BYTES']:
+        raise InvalidImage()
+    _decode(data)
+
+    # Identical uploads share a digest, so their renditions are only ever
+    # produced once.
+    digest = hashlib.sha256(data).hexdigest()[:32]
+    source = os.path.join(app.config['AVATAR_SOURCES_PATH'], digest)
+    if not os.path.exists(source):
+        os.makedirs(app.config['AVATAR_SOURCES_PATH'], exist_ok=True)
+        _write_atomic(source, lambda path: _write_bytes(path, data))
+        for rendition in app.config['AVATAR_RENDITIONS']:
+            _get_executor().submit(render_rendition, digest, rendition)
+    return digest
+
+
+def render_rendition(digest, rendition):
+    path = os.path.join(app.config['AVATARS_SAVE_PATH'], rendition_name(digest, rendition))
+    if os.path.exists(path):
+        return path
+    size = app.config['AVATAR_RENDITIONS'][rendition]
+    with Image.open(os.path.join(app.config['AVATAR_SOURCES_PATH'], digest)) as image:
+        # Re-encoding from pixel data drops EXIF and every other metadata block.
+        image = ImageOps.exif_transpose(image).convert('RGB')
+        image = ImageOps.fit(image, (size, size), Image.LANCZOS)
+    _write_atomic(path, lambda tmp: image.save(tmp, app.config['AVATAR_FORMAT'], quality=85))
+    return path
+
+
+def render_missing(filename):
+    match = RENDITION_PATTERN.match(filename)
+    if match is None or match.group(2) not in app.config['AVATAR_RENDITIONS']:
+        return False
+    digest, rendition, _ = match.groups()
+    if filename != rendition_name(digest, rendition):
+        return False
+    if not os.path.exists(os.path.join(app.config['AVATAR_SOURCES_PATH'], digest)):
+        return False
+    render_rendition(digest, rendition)
+    return True
+
+
+def _write_bytes(path, data):
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def _write_atomic(path, write):
+    tmp = f"{path}.{secrets.token_hex(4)}.tmp"
+    write(tmp)
+    os.replace(tmp, path)
+
+
+def _url_for(endpoint, **values):
+    # Job handlers put avatar URLs in SSE payloads with only an app context
+    # and no SERVER_NAME, where url_for can't build; a root-relative path
+    # from the URL map is all the browser needs.
+    if has_request_context():
+        return url_for(endpoint, **values)
+    return app.url_map.bind('', script_name=app.config['APPLICATION_ROOT']).build(endpoint, values)
+
+
+@app.template_global()
+def avatar_url(avatar, rendition='small'):
+    if not avatar:
+        return _url_for('avatars.static', filename=f'default/default_{DEFAULT_AVATAR_SIZES[rendition]}.jpg')
+    # Avatars uploaded before the pipeline existed stored their full URL.
+    if avatar.startswith('/'):
+        return avatar
+    return _url_for('get_avatar', filename=rendition_name(avatar, rendition))
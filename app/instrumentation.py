@@ -0,0 +1,133 @@
+import threading
+import time
+from collections import Counter
+from flask import g, request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+TIME_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+
+class Histogram(object):
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name, labels):
+        lines = [f'{name}_bucket{{{labels},le="{bound}"}} {count}' for bound, count in zip(self.buckets, self.counts)]
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {self.count}')
+        lines.append(f'{name}_sum{{{labels}}} {self.sum}')
+        lines.append(f'{name}_count{{{labels}}} {self.count}')
+        return lines
+
+
+class EndpointStats(object):
+
+    def __init__(self):
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.db_time = Histogram(TIME_BUCKETS)
+        self.n_plus_one = 0
+        self.slowest_statement = None
+        self.slowest_duration = 0
+
+
+class Instrumentation(object):
+    # Nothing is registered unless SQL_INSTRUMENTATION is set, so a disabled
+    # instance costs nothing per query or per request.
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.endpoints = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config['SQL_INSTRUMENTATION']
+        if not self.enabled:
+            return
+        self.app = app
+        self.n_plus_one_threshold = app.config['SQL_N_PLUS_ONE_THRESHOLD']
+        self.server_timing = app.config['SQL_SERVER_TIMING']
+        event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+        app.after_request(self._after_request)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        duration = time.perf_counter() - conn.info['query_start'].pop()
+        if not has_request_context():
+            return
+        if 'sql_queries' not in g:
+            g.sql_queries = Counter()
+            g.sql_time = 0
+            g.sql_slowest = (None, 0)
+        g.sql_queries[statement] += 1
+        g.sql_time += duration
+        if duration > g.sql_slowest[1]:
+            g.sql_slowest = (statement, duration)
+
+    def _after_request(self, response):
+        queries = g.get('sql_queries', Counter())
+        count = sum(queries.values())
+        db_time = g.get('sql_time', 0)
+        slowest, slowest_duration = g.get('sql_slowest', (None, 0))
+        repeated = [statement for statement, times in queries.items() if times >= self.n_plus_one_threshold]
+        endpoint = request.endpoint or 'unknown'
+
+        with self._lock:
+            stats = self.endpoints.setdefault(endpoint, EndpointStats())
+            stats.queries.observe(count)
+            stats.db_time.observe(db_time)
+            stats.n_plus_one += len(repeated)
+            new_slowest = slowest_duration > stats.slowest_duration
+            if new_slowest:
+                stats.slowest_statement = slowest
+                stats.slowest_duration = slowest_duration
+
+        if new_slowest:
+            self.app.logger.info('Slowest query in %s so far (%.1f ms): %s', endpoint, slowest_duration * 1000, slowest)
+        for statement in repeated:
+            self.app.logger.warning('Possible N+1 in %s: %d executions of %s', endpoint, queries[statement], statement)
+        if self.server_timing:
+            response.headers.add('Server-Timing', f'db;dur={db_time * 1000:.1f};desc="{count} queries"')
+        return response
+
+    def render_metrics(self):
+        # The exposition format wants each family's samples together, after
+        # its TYPE line, so endpoints are looped over inside each family.
+        with self._lock:
+            endpoints = sorted(self.endpoints.items())
+            lines = ['# TYPE sodo_db_queries_per_request histogram']
+            for endpoint, stats in endpoints:
+                lines += stats.queries.render('sodo_db_queries_per_request', f'endpoint="{endpoint}"')
+            lines.append('# TYPE sodo_db_seconds_per_request histogram')
+            for endpoint, stats in endpoints:
+                lines += stats.db_time.render('sodo_db_seconds_per_request', f'endpoint="{endpoint}"')
+            lines.append('# TYPE sodo_db_n_plus_one_total counter')
+            for endpoint, stats in endpoints:
+                lines.append(f'sodo_db_n_plus_one_total{{endpoint="{endpoint}"}} {stats.n_plus_one}')
+            lines.append('# TYPE sodo_db_slowest_query_seconds gauge')
+            for endpoint, stats in endpoints:
+                statement = _label_value(stats.slowest_statement or '')
+                lines.append(f'sodo_db_slowest_query_seconds{{endpoint="{endpoint}",statement="{statement}"}} '
+                             f'{stats.slowest_duration}')
+        return '\n'.join(lines) + '\n'
+
+
+def _label_value(statement, limit=200):
+    statement = ' '.join(statement.split())[:limit]
+    return statement.replace('\\', '\\\\').replace('"', '\\"')
@@ -0,0 +1,164 @@
+import json
+import secrets
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import and_, event, or_
+from app import app, db
+from app.fragments import fragments
+from app.models import Job, Timeline, get_users, insert_or_ignore, touch
+
+HANDLERS = {}
+
+_executor = None
+_last_purge = 0
+
+
+def handler(name):
+    def register(fn):
+        HANDLERS[name] = fn
+        return fn
+    return register
+
+
+def enqueue(name, key=None, **payload):
+    # The idempotency key is unique, so a double-submitted action enqueues
+    # its side effects only once. Returns True if a job was created.
+    created = insert_or_ignore(Job.__table__, name=name, key=key, payload=json.dumps(payload),
+                               status='queued', attempts=0, run_at=datetime.utcnow())
+    if created:
+        db.session.info['jobs_enqueued'] = True
+    return created
+
+
+def defer_timeline(user, body, key=None):
+    return enqueue('timeline', key=key, user_id=user.id, body=body, timestamp=datetime.utcnow().isoformat())
+
+
+def defer_notification(user, actor, body, key=None):
+    return enqueue('notification', key=key, user_id=user.id, actor_id=actor.id, body=body)
+
+
+@handler('timeline')
+def apply_timeline(user_id, body, timestamp):
+    db.session.add(Timeline(user_id=user_id, body=body, timestamp=datetime.fromisoformat(timestamp)))
+    fragments.invalidate('timeline', user_id)
+    touch(user_id)
+
+
+@handler('notification')
+def apply_notification(user_id, actor_id, body):
+    users = get_users([user_id, actor_id])
+    users[user_id].add_notification(actor=users[actor_id], body=body)
+
+
+def _claimable(now):
+    # run_at doubles as the lease on a running job, so a job whose worker
+    # died mid-batch is claimed again once its lease runs out.
+    return and_(or_(Job.status == 'queued', Job.status == 'running'), Job.run_at <= now)
+
+
+def _claim(limit):
+    # One guarded UPDATE takes the jobs, so two workers (the web process's
+    # drain thread and `flask jobs work`, say) can never both claim a job.
+    now = datetime.utcnow()
+    token = secrets.token_hex(16)
+    ids = db.select([Job.id]).where(_claimable(now)).order_by(Job.id).limit(limit)
+    if db.engine.dialect.name == 'postgresql':
+        ids = ids.with_for_update(skip_locked=True)
+    db.session.execute(Job.__table__.update().where(and_(Job.id.in_(ids), _claimable(now)))
+                       .values(status='running', claim=token, attempts=Job.attempts + 1,
+                               run_at=now + timedelta(seconds=app.config['JOB_LEASE_SECONDS'])))
+    db.session.commit()
+    return token, Job.query.filter_by(claim=token).order_by(Job.id).all()
+
+
+def _finish(job_ids, token, **values):
+    # Only touches jobs this batch still holds; if the lease ran out and
+    # another worker took them over, that worker records the outcome.
+    if job_ids:
+        db.session.execute(Job.__table__.update()
+                           .where(and_(Job.id.in_(job_ids), Job.claim == token)).values(**values))
+
+
+def run_batch(limit=None):
+    # Every claimed job is applied in one transaction; each runs in its own
+    # savepoint so a failing job is retried without discarding the others.
+    token, jobs = _claim(limit or app.config['JOB_BATCH_SIZE'])
+    done = []
+    for job in jobs:
+        try:
+            with db.session.begin_nested():
+                HANDLERS[job.name](**json.loads(job.payload))
+        except Exception as error:
+            if job.attempts >= app.config['JOB_MAX_ATTEMPTS']:
+                app.logger.exception('Job %s (%s) failed permanently', job.id, job.name)
+                _finish([job.id], token, status='failed', error=str(error)[:255])
+            else:
+                _finish([job.id], token, status='queued', error=str(error)[:255],
+                        run_at=datetime.utcnow() + timedelta(seconds=2 ** job.attempts))
+        else:
+            done.append(job.id)
+    _finish(done, token, status='done')
+    db.session.commit()
+    return len(jobs)
+
+
+def purge_done():
+    cutoff = datetime.utcnow() - timedelta(hours=app.config['JOB_RETENTION_HOURS'])
+    db.session.execute(Job.__table__.delete().where(and_(Job.status == 'done', Job.created_at < cutoff)))
+    db.session.commit()
+
+
+def purge_if_due():
+    # Done jobs are kept for a while so their idempotency keys still catch
+    # double submissions, then dropped so the same action can happen again.
+    global _last_purge
+    if time.monotonic() - _last_purge > app.config['JOB_PURGE_INTERVAL']:
+        purge_done()
+        _last_purge = time.monotonic()
+
+
+def has_pending():
+    pending = db.session.query(db.exists().where(Job.status.in_(('queued', 'running')))).scalar()
+    db.session.commit()
+    return pending
+
+
+def run_batch_in_context():
+    # Workers loop for as long as they run, so each batch gets its own app
+    # context: g's user cache and the session are dropped with it instead of
+    # pinning every actor a batch loaded.
+    with app.app_context():
+        ran = run_batch()
+        purge_if_due()
+        return ran
+
+
+def _run_in_thread():
+    # Keeps polling while retries are waiting for their run_at, since no new
+    # commit may come along to wake it for them.
+    while True:
+        if run_batch_in_context():
+            continue
+        with app.app_context():
+            if not has_pending():
+                return
+        time.sleep(app.config['JOB_POLL_INTERVAL'])
+
+
+@event.listens_for(db.session, 'after_commit')
+def _wake_thread_worker(session):
+    # In 'thread' mode (development) jobs are drained by a single background
+    # thread; in 'worker' mode a separate `flask jobs work` process does it.
+    global _executor
+    if not session.info.pop('jobs_enqueued', False) or app.config['JOB_MODE'] != 'thread':
+        return
+    if _executor is None:
+        _executor = ThreadPoolExecutor(1)
+    _executor.submit(_run_in_thread)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _forget_enqueued(session):
+    session.info.pop('jobs_enqueued', None)
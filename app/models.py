@@ -1,29 +1,85 @@
-from app import db
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import g, has_app_context
+from app import app, db
+from app.cache import LRUCache
+from app.events import publish_on_commit
+from app.images import avatar_url
+from app.fragments import fragments
+from app.passwords import hash_password, verify_password, needs_rehash
 from flask_login import UserMixin
 from app import login
 from datetime import datetime
+from sqlalchemy import and_, or_
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
 
 followers = db.Table('followers',
-                     db.Column('follower_id', db.Integer, db.ForeignKey('user.id')),
-                     db.Column('followed_id', db.Integer, db.ForeignKey('user.id')))
+                     db.Column('follower_id', db.Integer, db.ForeignKey('user.id'), primary_key=True),
+                     db.Column('followed_id', db.Integer, db.ForeignKey('user.id'), primary_key=True),
+                     db.Index('ix_followers_followed_id', 'followed_id'))
+
+
+def insert_or_ignore(table, **values):
+    # Lets a unique constraint decide whether a row already exists instead of
+    # racing a separate SELECT. Returns True if a row was inserted.
+    dialect = db.engine.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        insert = {'sqlite': sqlite_insert, 'postgresql': postgresql_insert}[dialect]
+        return db.session.execute(insert(table).values(**values).on_conflict_do_nothing()).rowcount > 0
+    try:
+        with db.session.begin_nested():
+            db.session.execute(table.insert().values(**values))
+    except IntegrityError:
+        return False
+    return True
+
+
+def increment(model, id, **deltas):
+    # Counters are bumped in the UPDATE itself so concurrent requests can't
+    # lose each other's changes.
+    db.session.execute(model.__table__.update().where(model.id == id)
+                       .values({getattr(model, column): getattr(model, column) + delta
+                                for column, delta in deltas.items()}))
+
+
+def touch(*user_ids):
+    # Moves the watermark that conditional GETs of these users' pages are
+    # validated against.
+    db.session.execute(User.__table__.update().where(User.id.in_(user_ids))
+                       .values(last_modified=datetime.utcnow()))
+
+
+def rebuild_counters():
+    like_count = db.select([db.func.count()]).where(TodoReaction.todo_id == Todo.id).scalar_subquery()
+    db.session.execute(Todo.__table__.update().values(like_count=like_count))
+    follower_count = db.select([db.func.count()]).where(followers.c.followed_id == User.id).scalar_subquery()
+    following_count = db.select([db.func.count()]).where(followers.c.follower_id == User.id).scalar_subquery()
+    db.session.execute(User.__table__.update().values(follower_count=follower_count,
+                                                      following_count=following_count))
 
 
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(64), index=True, unique=True)
-    bio = db.Column(db.String(120), index=True, default=None)
+    bio = db.Column(db.String(120), default=None)
     first_name = db.Column(db.String(64), index=True, nullable=False)
     last_name = db.Column(db.String(64), index=True, nullable=False)
     email = db.Column(db.String(120), index=True, unique=True)
-    avatar = db.Column(db.String(64), index=True)
+    avatar = db.Column(db.String(64))
     password_hash = db.Column(db.String(128))
     password_reset = db.Column(db.String(15), index=True, unique=True, default=None)
+    fanout_on_read = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
     todos = db.relation('Todo', backref='user', lazy='dynamic')
 
     timeline = db.relationship('Timeline', backref='user', lazy='dynamic')
 
     last_notification_read_time = db.Column(db.DateTime)
+    unread_notifications = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    follower_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    following_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    last_modified = db.Column(db.DateTime, default=datetime.utcnow)
     notifications = db.relationship('Notification', backref='user', lazy='dynamic')
 
     followed = db.relationship(
@@ -33,14 +89,21 @@ class User(UserMixin, db.Model):
         backref=db.backref('followers', lazy='dynamic'), lazy='dynamic')
 
     def follow(self, user):
-        if not self.is_following(user):
-            self.followed.append(user)
-            self.add_timeline(f"Followed <strong>{user.get_full_name()}</strong>")
-            user.add_notification(actor=self, body="{actor_name} has started following you")
+        if insert_or_ignore(followers, follower_id=self.id, followed_id=user.id):
+            increment(User, self.id, following_count=1)
+            increment(User, user.id, follower_count=1)
+            FeedEntry.add_author(self, user)
+            return True
+        return False
 
     def unfollow(self, user):
-        if self.is_following(user):
-            self.followed.remove(user)
+        removed = db.session.execute(followers.delete().where(
+            and_(followers.c.follower_id == self.id, followers.c.followed_id == user.id))).rowcount
+        if removed:
+            increment(User, self.id, following_count=-1)
+            increment(User, user.id, follower_count=-1)
+            FeedEntry.remove_author(self, user)
+        return removed > 0
 
     def is_following(self, user):
         return self.followed.filter(
@@ -52,42 +115,118 @@ class User(UserMixin, db.Model):
     def get_formatted_name(self):
         return f"{self.first_name} {self.last_name[0]}"
 
-    def get_pending_todos(self):
-        return self.todos.filter_by(completed=False).all()
-
-    def get_feed(self):
-        followed = Todo.query.filter_by(completed=True).join(
-            followers, (followers.c.followed_id == Todo.user_id)) \
-            .filter(followers.c.follower_id == self.id)
-        own = Todo.query.filter_by(user_id=self.id).filter_by(completed=True)
-        return followed.union(own).order_by(Todo.completed_at.desc())
+    def get_pending_todos(self, limit=None, newest_first=False):
+        # Plain rows rather than Todo instances: the todo list only renders
+        # these columns, so there's nothing to gain from hydrating the ORM.
+        order = Todo.created_at.desc() if newest_first else Todo.created_at
+        query = db.session.query(Todo.id, Todo.title, Todo.description, Todo.created_at, Todo.version) \
+            .filter(Todo.user_id == self.id, Todo.completed.is_(False)) \
+            .order_by(order, Todo.id)
+        if limit is not None:
+            query = query.limit(limit)
+        return query.all()
+
+    def get_feed(self, before=None, limit=None):
+        # Authors under the fan-out limit have their todos pushed into
+        # feed_entry on completion; the rest are pulled here at read time.
+        # Each source is ordered and limited on its own index before the two
+        # are merged, so a page reads at most limit rows from each.
+        pushed = Todo.query.join(FeedEntry, FeedEntry.todo_id == Todo.id) \
+            .filter(FeedEntry.owner_id == self.id) \
+            .order_by(FeedEntry.completed_at.desc(), FeedEntry.todo_id.desc())
+        if before is not None:
+            pushed = pushed.filter(FeedEntry.completed_before(*before))
+        todos = pushed.limit(limit).all()
+
+        pulled_authors = [id for id, in db.session.query(followers.c.followed_id)
+                          .join(User, User.id == followers.c.followed_id)
+                          .filter(followers.c.follower_id == self.id, User.fanout_on_read.is_(True))]
+        if pulled_authors:
+            # completed_at IS NOT NULL is always true here; it lets the planner
+            # range-scan ix_todo_user_id_completed_completed_at per author.
+            pulled = Todo.query.filter(Todo.user_id.in_(pulled_authors), Todo.completed.is_(True),
+                                       Todo.completed_at.isnot(None)) \
+                .order_by(Todo.completed_at.desc(), Todo.id.desc())
+            if before is not None:
+                pulled = pulled.filter(Todo.completed_before(*before))
+            todos = sorted(set(todos) | set(pulled.limit(limit)), key=lambda todo: (todo.completed_at, todo.id),
+                           reverse=True)[:limit]
+        return todos
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        if not verify_password(self.password_hash, password):
+            return False
+        if needs_rehash(self.password_hash):
+            self.set_password(password)
+        return True
 
     def add_timeline(self, body):
         timeline = Timeline(user=self, body=body)
         db.session.add(timeline)
+        fragments.invalidate('timeline', self.id)
+        touch(self.id)
         return timeline
 
+    @staticmethod
+    def todo_watermark(id):
+        # The todo page shows the user's own todos and notifications plus
+        # what the people they follow completed, and those authors' touches
+        # cover likes and edits to their todos. One indexed lookup.
+        followed = db.select([followers.c.followed_id]).where(followers.c.follower_id == id)
+        return db.session.query(db.func.max(User.last_modified)) \
+            .filter(or_(User.id == id, User.id.in_(followed))).scalar()
+
+    @staticmethod
+    def profile_watermark(viewer_id, username):
+        # Returns None if there's no such profile.
+        rows = db.session.query(User.username, User.last_modified) \
+            .filter(or_(User.id == viewer_id, User.username == username)).all()
+        if username not in {row.username for row in rows}:
+            return None
+        return max((row.last_modified for row in rows if row.last_modified is not None), default=None)
+
     def get_notifications(self):
-        return self.notifications.order_by(Notification.timestamp.desc()).limit(10).all()
+        notifications = self.notifications.order_by(Notification.timestamp.desc()).limit(10).all()
+        # Rows written before bodies were pre-rendered need their actors;
+        # load them all in one query rather than one per notification.
+        pending = [notification for notification in notifications if notification.rendered is None]
+        if pending:
+            actors = get_users(notification.actor_id for notification in pending)
+            for notification in pending:
+                notification.render_for_display(actors[notification.actor_id])
+        return notifications
 
     def get_timeline(self):
         return self.timeline.order_by(Timeline.timestamp.desc()).limit(10).all()
 
     def add_notification(self, actor, body):
-        notification = Notification(actor_id=actor.id, body=body, user=self)
+        notification = Notification(actor_id=actor.id, body=body, user=self, timestamp=datetime.utcnow())
+        notification.render(actor)
         db.session.add(notification)
+        db.session.execute(User.__table__.update().where(User.id == self.id)
+                           .values(unread_notifications=User.unread_notifications + 1,
+                                   last_modified=datetime.utcnow()))
+        invalidate_user(self.id)
+        fragments.invalidate('nav', self.id)
+        publish_on_commit(self.id, 'notification', {
+            'body': notification.rendered,
+            'avatar': avatar_url(notification.actor_avatar),
+            'timestamp': notification.timestamp.isoformat(),
+        })
         return notification
 
+    def read_notifications(self):
+        self.last_notification_read_time = datetime.utcnow()
+        self.unread_notifications = 0
+        self.last_modified = datetime.utcnow()
+        invalidate_user(self.id)
+        fragments.invalidate('nav', self.id)
+
     def new_notifications(self):
-        last_read_time = self.last_message_read_time or datetime(1900, 1, 1)
-        return Notification.query.filter_by(recipient=self).filter(
-            Notification.timestamp > last_read_time).count()
+        return self.unread_notifications
 
     def __repr__(self):
         return '<User {}>'.format(self.username)
@@ -95,7 +234,86 @@ class User(UserMixin, db.Model):
 
 @login.user_loader
 def load_user(id):
-    return User.query.get(int(id))
+    return get_user(int(id))
+
+
+# Column values of recently loaded users, shared across requests when
+# USER_CACHE_TTL is set. Rows rather than instances are kept because an
+# instance can't outlive the session that loaded it.
+user_cache = LRUCache(app.config['USER_CACHE_SIZE'], app.config['USER_CACHE_TTL'])
+
+
+def _request_users():
+    if not has_app_context():
+        return {}
+    if 'users' not in g:
+        g.users = {}
+        g.user_cache_hits = 0
+        g.user_cache_misses = 0
+    return g.users
+
+
+def _count_lookup(hit):
+    if has_app_context():
+        if hit:
+            g.user_cache_hits += 1
+        else:
+            g.user_cache_misses += 1
+
+
+def _from_shared_cache(id):
+    if not app.config['USER_CACHE_TTL']:
+        return None
+    values = user_cache.get(id)
+    if values is None:
+        return None
+    user = User(**values)
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
+
+
+def _remember(users, user):
+    users[user.id] = user
+    if app.config['USER_CACHE_TTL']:
+        user_cache.set(user.id, {column.key: getattr(user, column.key) for column in db.inspect(User).column_attrs})
+
+
+def get_user(id):
+    users = _request_users()
+    user = users.get(id) or _from_shared_cache(id)
+    _count_lookup(user is not None)
+    if user is None:
+        user = User.query.get(id)
+        if user is None:
+            return None
+        _remember(users, user)
+    users[id] = user
+    return user
+
+
+def get_users(ids):
+    # Resolves every id with at most one IN query and primes the request
+    # cache so later get_user calls for the same ids are free.
+    users = _request_users()
+    found = {}
+    missing = []
+    for id in set(ids):
+        user = users.get(id) or _from_shared_cache(id)
+        _count_lookup(user is not None)
+        if user is None:
+            missing.append(id)
+        else:
+            users[id] = found[id] = user
+    if missing:
+        for user in User.query.filter(User.id.in_(missing)):
+            _remember(users, user)
+            found[user.id] = user
+    return found
+
+
+def invalidate_user(id):
+    _request_users().pop(id, None)
+    user_cache.delete(id)
 
 
 class Todo(db.Model):
@@ -106,23 +324,132 @@ class Todo(db.Model):
     completed = db.Column(db.Boolean, index=True, default=False)
     completed_at = db.Column(db.DateTime, index=True, default=None, nullable=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    like_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     reactions = db.relation('TodoReaction', backref='todo', lazy='dynamic')
 
+    __table_args__ = (db.Index('ix_todo_user_id_completed_completed_at', 'user_id', 'completed', 'completed_at'),
+                      db.Index('ix_todo_user_id_completed_created_at', 'user_id', 'completed', 'created_at'))
+
     def get_creator(self):
-        return User.query.get(self.user_id)
+        return get_user(self.user_id)
 
     def has_liked(self, user):
         return self.reactions.filter_by(user_id=user.id).count() > 0
 
+    @staticmethod
+    def apply_edits(user_id, edits):
+        # edits maps todo id -> (version, {field: value}). A single UPDATE
+        # covers every todo, and a row only changes if nobody has saved it
+        # since the client read its version. Returns the saved rows and the
+        # current state of the ones that conflicted or aren't the user's.
+        table = Todo.__table__
+        values = {'version': table.c.version + 1}
+        for field in ('title', 'description'):
+            whens = {id: changes[field] for id, (_, changes) in edits.items() if field in changes}
+            if whens:
+                values[field] = db.case(whens, value=table.c.id, else_=table.c[field])
+        guards = [and_(table.c.id == id, table.c.version == version) for id, (version, _) in edits.items()]
+        db.session.execute(table.update().where(and_(table.c.user_id == user_id, or_(*guards))).values(values))
+
+        rows = db.session.execute(db.select([table.c.id, table.c.version, table.c.title, table.c.description])
+                                  .where(and_(table.c.user_id == user_id, table.c.id.in_(list(edits))))).fetchall()
+        saved, conflicts = [], []
+        for row in rows:
+            version, changes = edits[row.id]
+            if row.version == version + 1 and all(row._mapping[field] == value for field, value in changes.items()):
+                saved.append({'id': row.id, 'version': row.version})
+            else:
+                conflicts.append(dict(row._mapping))
+        if saved:
+            touch(user_id)
+        missing = set(edits) - {row.id for row in rows}
+        return saved, conflicts, sorted(missing)
+
+    @staticmethod
+    def completed_before(completed_at, id):
+        return or_(Todo.completed_at < completed_at,
+                   and_(Todo.completed_at == completed_at, Todo.id < id))
+
     def __repr__(self):
         return '<Todo {}>'.format(self.title)
 
 
+class FeedEntry(db.Model):
+    owner_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    completed_at = db.Column(db.DateTime, primary_key=True)
+    todo_id = db.Column(db.Integer, db.ForeignKey('todo.id'), primary_key=True, index=True)
+
+    @staticmethod
+    def completed_before(completed_at, todo_id):
+        return or_(FeedEntry.completed_at < completed_at,
+                   and_(FeedEntry.completed_at == completed_at, FeedEntry.todo_id < todo_id))
+
+    @staticmethod
+    def fan_out(todo):
+        author = todo.user
+        if not author.fanout_on_read and author.follower_count > app.config['FEED_FANOUT_LIMIT']:
+            author.fanout_on_read = True
+        audience = [author.id]
+        if not author.fanout_on_read:
+            audience += [follower_id for follower_id, in db.session.query(followers.c.follower_id)
+                         .filter(followers.c.followed_id == author.id).distinct()]
+        db.session.execute(FeedEntry.__table__.insert(),
+                           [{'owner_id': owner_id, 'completed_at': todo.completed_at, 'todo_id': todo.id}
+                            for owner_id in audience])
+        return audience
+
+    @staticmethod
+    def add_author(owner, author):
+        if author.fanout_on_read:
+            return
+        completed = db.select([db.literal(owner.id), Todo.completed_at, Todo.id]) \
+            .where(and_(Todo.user_id == author.id, Todo.completed.is_(True)))
+        db.session.execute(FeedEntry.__table__.insert().from_select(
+            ['owner_id', 'completed_at', 'todo_id'], completed))
+
+    @staticmethod
+    def remove_author(owner, author):
+        authored = db.select([Todo.id]).where(Todo.user_id == author.id)
+        db.session.execute(FeedEntry.__table__.delete().where(
+            and_(FeedEntry.owner_id == owner.id, FeedEntry.todo_id.in_(authored))))
+
+    @staticmethod
+    def remove_todo(todo):
+        db.session.execute(FeedEntry.__table__.delete().where(FeedEntry.todo_id == todo.id))
+
+    @staticmethod
+    def rebuild():
+        table = FeedEntry.__table__
+        db.session.execute(table.delete())
+
+        follower_counts = db.select([followers.c.followed_id]) \
+            .group_by(followers.c.followed_id) \
+            .having(db.func.count(db.distinct(followers.c.follower_id)) > app.config['FEED_FANOUT_LIMIT'])
+        db.session.execute(User.__table__.update().values(
+            fanout_on_read=User.id.in_(follower_counts)))
+
+        own = db.select([Todo.user_id, Todo.completed_at, Todo.id]).where(Todo.completed.is_(True))
+        db.session.execute(table.insert().from_select(['owner_id', 'completed_at', 'todo_id'], own))
+
+        followed = db.select([followers.c.follower_id, Todo.completed_at, Todo.id]).distinct() \
+            .select_from(Todo.__table__
+                         .join(followers, followers.c.followed_id == Todo.user_id)
+                         .join(User.__table__, User.id == Todo.user_id)) \
+            .where(and_(Todo.completed.is_(True), User.fanout_on_read.is_(False)))
+        db.session.execute(table.insert().from_select(['owner_id', 'completed_at', 'todo_id'], followed))
+
+    def __repr__(self):
+        return '<FeedEntry {}: {}>'.format(self.owner_id, self.todo_id)
+
+
 class TodoReaction(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     todo_id = db.Column(db.Integer, db.ForeignKey('todo.id'))
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
 
+    __table_args__ = (db.Index('ix_todo_reaction_todo_id_user_id', 'todo_id', 'user_id', unique=True),)
+
     def __repr__(self):
         return '<TodoReaction {}: {}>'.format(self.todo_id, self.user_id)
 
@@ -133,16 +460,34 @@ class Notification(db.Model):
     actor_id = db.Column(db.Integer, nullable=False)
     timestamp = db.Column(db.DateTime, index=True, default=datetime.utcnow)
     body = db.Column(db.String(120), nullable=False)
+    rendered = db.Column(db.String(255))
+    actor_avatar = db.Column(db.String(64))
+
+    __table_args__ = (db.Index('ix_notification_user_id_timestamp', 'user_id', 'timestamp'),)
 
     def get_actor(self):
-        return User.query.get(self.actor_id)
+        return get_user(self.actor_id)
 
-    def get_data(self):
-        actor = self.get_actor()
+    def format(self, actor):
         return self.body.replace("{actor_username}", actor.username) \
             .replace("{actor_name}", actor.get_formatted_name()) \
             .replace("{actor_full_name}", actor.get_full_name())
 
+    def render(self, actor):
+        self.rendered = self.format(actor)
+        self.actor_avatar = actor.avatar
+
+    def render_for_display(self, actor):
+        # For rows stored before bodies were pre-rendered. The values are set
+        # as if loaded, so reading notifications never flushes an UPDATE.
+        set_committed_value(self, 'rendered', self.format(actor))
+        set_committed_value(self, 'actor_avatar', actor.avatar)
+
+    def get_data(self):
+        if self.rendered is None:
+            self.render_for_display(self.get_actor())
+        return self.rendered
+
     def get_time(self):
         return str(self.timestamp)
 
@@ -153,5 +498,25 @@ class Timeline(db.Model):
     timestamp = db.Column(db.DateTime, index=True, default=datetime.utcnow)
     body = db.Column(db.String(120), nullable=False)
 
+    __table_args__ = (db.Index('ix_timeline_user_id_timestamp', 'user_id', 'timestamp'),)
+
     def __repr__(self):
         return '<Timeline {}>'.format(self.body)
+
+
+class Job(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(64), nullable=False)
+    key = db.Column(db.String(128), unique=True)
+    payload = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(16), nullable=False, default='queued')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    error = db.Column(db.String(255))
+    claim = db.Column(db.String(32), index=True)
+
+    __table_args__ = (db.Index('ix_job_status_run_at', 'status', 'run_at'),)
+
+    def __repr__(self):
+        return '<Job {}: {}>'.format(self.id, self.name)
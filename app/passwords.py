@@ -0,0 +1,35 @@
+from concurrent.futures import ProcessPoolExecutor
+from werkzeug.security import generate_password_hash, check_password_hash
+from app import app
+
+_executor = None
+
+
+def _get_executor():
+    # Created on first use so every gunicorn worker forks its own pool after
+    # it has started, rather than inheriting one from the master.
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(app.config['PASSWORD_HASH_WORKERS'])
+    return _executor
+
+
+def _run(fn, *args):
+    if not app.config['PASSWORD_HASH_WORKERS']:
+        return fn(*args)
+    return _get_executor().submit(fn, *args).result()
+
+
+def hash_password(password):
+    return _run(generate_password_hash, password,
+                app.config['PASSWORD_HASH_METHOD'], app.config['PASSWORD_SALT_LENGTH'])
+
+
+def verify_password(pwhash, password):
+    return _run(check_password_hash, pwhash, password)
+
+
+def needs_rehash(pwhash):
+    method, _, rest = pwhash.partition('$')
+    salt = rest.partition('$')[0]
+    return method != app.config['PASSWORD_HASH_METHOD'] or len(salt) != app.config['PASSWORD_SALT_LENGTH']
@@ -0,0 +1,92 @@
+import itertools
+import threading
+import time
+from functools import wraps
+from flask import current_app, g, request, session
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import orm, text
+from sqlalchemy.exc import DBAPIError
+
+
+class ReplicaSet(object):
+    # Round-robins over the replica binds, skipping any that failed a health
+    # check within the last REPLICA_HEALTH_INTERVAL seconds.
+
+    def __init__(self, db, binds, health_interval):
+        self.db = db
+        self.binds = binds
+        self.health_interval = health_interval
+        self._cycle = itertools.cycle(binds)
+        self._checked = {}
+        self._lock = threading.Lock()
+
+    def _healthy(self, bind):
+        now = time.monotonic()
+        healthy, checked_at = self._checked.get(bind, (True, 0))
+        if now - checked_at < self.health_interval:
+            return healthy
+        try:
+            with self.db.get_engine(bind=bind).connect() as connection:
+                connection.execute(text('SELECT 1'))
+            healthy = True
+        except DBAPIError:
+            current_app.logger.warning('Read replica %s failed its health check', bind)
+            healthy = False
+        self._checked[bind] = (healthy, now)
+        return healthy
+
+    def pick(self):
+        for _ in range(len(self.binds)):
+            with self._lock:
+                bind = next(self._cycle)
+            if self._healthy(bind):
+                return self.db.get_engine(bind=bind)
+        return None
+
+
+class RoutingSession(SignallingSession):
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self._flushing or getattr(clause, 'is_dml', False):
+            g.wrote = True
+        elif _reads_from_replica():
+            engine = self.app.extensions['sqlalchemy'].db.replicas.pick()
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper, clause=clause, **kwargs)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def init_app(self, app):
+        super().init_app(app)
+        self.replicas = ReplicaSet(self, app.config['SQLALCHEMY_REPLICAS'], app.config['REPLICA_HEALTH_INTERVAL'])
+        app.after_request(_remember_write)
+
+
+def _reads_from_replica():
+    return g.get('replica_reads', False) and not g.get('wrote', False)
+
+
+def _remember_write(response):
+    # Read-your-writes: after anything that wrote, this browser reads from
+    # the primary until replicas have had time to catch up.
+    if not current_app.config['SQLALCHEMY_REPLICAS']:
+        return response
+    if g.get('wrote') or request.method not in ('GET', 'HEAD'):
+        session['primary_until'] = time.time() + current_app.config['REPLICA_STICKY_SECONDS']
+    return response
+
+
+def replica_reads(view):
+    # Opt-in for read-only GET views; many of this app's GET routes write.
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if current_app.config['SQLALCHEMY_REPLICAS'] and request.method in ('GET', 'HEAD') \
+                and session.get('primary_until', 0) < time.time():
+            g.replica_reads = True
+        return view(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,72 @@
+import gzip
+import json
+import os
+from datetime import datetime, timedelta
+from sqlalchemy.orm import aliased
+from app import app, db
+from app.models import Timeline, Notification
+
+RETAINED = {
+    'timeline': (Timeline, 'TIMELINE_RETENTION_DAYS'),
+    'notification': (Notification, 'NOTIFICATION_RETENTION_DAYS'),
+}
+
+
+def _expiry_cutoffs(model, cutoff, keep_latest):
+    # A row expires once it is past the cutoff and the user has at least
+    # keep_latest newer rows, so the profile/nav top-N never goes empty. That
+    # is the same as being older than the user's keep_latest-th newest row,
+    # looked up once per user as a bounded probe on the (user_id, timestamp)
+    # index. Deleting older rows never moves it, so it holds for the whole run.
+    users = db.session.query(model.user_id).filter(model.timestamp < cutoff).distinct().subquery()
+    if keep_latest <= 0:
+        return [(user_id, cutoff) for user_id, in db.session.query(users.c.user_id)]
+    newer = aliased(model)
+    kept_from = db.select([newer.timestamp]) \
+        .where(newer.user_id == users.c.user_id) \
+        .order_by(newer.timestamp.desc()).limit(1).offset(keep_latest - 1) \
+        .scalar_subquery()
+    return [(user_id, min(cutoff, kept)) for user_id, kept in
+            db.session.query(users.c.user_id, kept_from) if kept is not None]
+
+
+def _expired_ids(model, user_id, expires_before, limit):
+    return [id for id, in db.session.query(model.id)
+            .filter(model.user_id == user_id, model.timestamp < expires_before)
+            .order_by(model.timestamp).limit(limit)]
+
+
+def _archive(model, ids, archive_dir):
+    table = model.__table__
+    path = os.path.join(archive_dir, f"{table.name}-{datetime.utcnow():%Y%m%d}.jsonl.gz")
+    with gzip.open(path, 'at') as f:
+        for row in db.session.execute(table.select().where(table.c.id.in_(ids))):
+            f.write(json.dumps({key: value.isoformat() if isinstance(value, datetime) else value
+                                for key, value in row._mapping.items()}) + '\n')
+
+
+def _delete(model, ids, archive_dir):
+    if archive_dir is not None:
+        _archive(model, ids, archive_dir)
+    db.session.execute(model.__table__.delete().where(model.__table__.c.id.in_(ids)))
+    # Committing per batch keeps each write lock short.
+    db.session.commit()
+    return len(ids)
+
+
+def compact(name, archive_dir=None):
+    model, setting = RETAINED[name]
+    cutoff = datetime.utcnow() - timedelta(days=app.config[setting])
+    batch_size = app.config['RETENTION_BATCH_SIZE']
+    total = 0
+    ids = []
+    for user_id, expires_before in _expiry_cutoffs(model, cutoff, app.config['RETENTION_KEEP_LATEST']):
+        while True:
+            ids += _expired_ids(model, user_id, expires_before, batch_size - len(ids))
+            if len(ids) < batch_size:
+                break
+            total += _delete(model, ids, archive_dir)
+            ids = []
+    if ids:
+        total += _delete(model, ids, archive_dir)
+    return total
@@ -1,8 +1,17 @@
-from app import app, db
-import os, secrets
-from flask import request, redirect, url_for, render_template, send_from_directory, jsonify
+from app import app, db, instrumentation
+import os
+from flask import request, redirect, url_for, render_template, send_from_directory, jsonify, abort, Response, g
 from flask_login import current_user, login_user, logout_user, login_required
-from app.models import User, Todo, TodoReaction, Notification
+from app.models import User, Todo, Notification, get_user, invalidate_user, touch
+from app.actions import perform, InvalidAction
+from app.feed import get_feed_page, serialize_feed_item, InvalidCursor
+from app.directory import directory
+from app.fragments import fragments
+from app.events import stream
+from app.images import store_avatar, render_missing, avatar_url, InvalidImage
+from app.assets import cache_immutable, conditional_page
+from app.jobs import defer_timeline
+from app.replicas import replica_reads
 from datetime import datetime
 
 
@@ -16,7 +25,14 @@ def index():
 
 @app.route('/avatars/<path:filename>')
 def get_avatar(filename):
-    return send_from_directory(app.config['AVATARS_SAVE_PATH'], filename)
+    # Renditions are produced in the background; render on demand if this
+    # request arrives first or lands on a worker that didn't do the upload.
+    if not os.path.exists(os.path.join(app.config['AVATARS_SAVE_PATH'], filename)):
+        render_missing(filename)
+    # Avatar files are never rewritten under the same name, so the name
+    # itself identifies the content.
+    response = send_from_directory(app.config['AVATARS_SAVE_PATH'], filename)
+    return cache_immutable(response, os.path.splitext(filename)[0])
 
 
 @app.route('/login', methods=['GET', 'POST'])
@@ -34,6 +50,7 @@ def login():
     if user is None or not user.check_password(password):
         return render_template('login.html', error='Invalid username or password')
 
+    db.session.commit()
     login_user(user)
     return redirect(url_for('index'))
 
@@ -73,38 +90,64 @@ def signup():
     user.set_password(password)
     db.session.add(user)
     db.session.commit()
+    directory.invalidate()
     login_user(user)
     return redirect(url_for('index'))
 
 
 @app.route('/todo', methods=['GET', 'POST'])
 @login_required
+@replica_reads
 def todo():
     if request.method == 'GET':
-        return render_template('todo.html', todos=Todo.query.filter_by(completed=False).all(),
-                               users=User.query.all())
+        return conditional_page(User.todo_watermark(current_user.id), render_todo_page,
+                                current_user.id, request.full_path)
     title = request.form['title']
     description = request.form['description']
     if title == '':
         return redirect(url_for('todo'))
-    user = User.query.get(current_user.id)
+    user = get_user(current_user.id)
     newTodo = Todo(title=title, description=description, user=user)
     db.session.add(newTodo)
-    user.add_timeline(f"Created a new task <strong>{title}</strong>")
+    touch(user.id)
+    defer_timeline(user, f"Created a new task <strong>{title}</strong>")
     db.session.commit()
     return redirect(url_for('todo'))
 
 
+def render_todo_page():
+    feed, next_cursor = load_feed_page()
+    pending = current_user.get_pending_todos(limit=app.config['PENDING_TODO_LIMIT'])
+    return render_template('todo.html', pending=pending, feed=feed, next_cursor=next_cursor)
+
+
+@app.route('/feed')
+@login_required
+@replica_reads
+def feed_page():
+    feed, next_cursor = load_feed_page()
+    return render_template('includes/feed_items.html', feed=feed, next_cursor=next_cursor)
+
+
+@app.route('/api/feed')
+@login_required
+@replica_reads
+def api_feed():
+    feed, next_cursor = load_feed_page()
+    return jsonify(items=[serialize_feed_item(item) for item in feed], next_cursor=next_cursor)
+
+
+def load_feed_page():
+    try:
+        return get_feed_page(current_user, cursor=request.args.get('cursor'))
+    except InvalidCursor:
+        abort(400)
+
+
 @app.route('/todo/<id>/complete')
 @login_required
 def complete_todo(id):
-    todo = Todo.query.get(int(id))
-    if todo is None:
-        return redirect(url_for('todo'))
-    todo.completed = True
-    todo.completed_at = datetime.utcnow()
-    current_user.add_timeline(f"Completed task <strong>{todo.title}</strong>")
-    db.session.commit()
+    perform_and_commit('complete', todo_id=id)
     return redirect(url_for('todo'))
 
 
@@ -112,7 +155,7 @@ def complete_todo(id):
 @login_required
 def edit_todo(id):
     todo = Todo.query.get(int(id))
-    if todo is None:
+    if todo is None or todo.user_id != current_user.id:
         return jsonify(result="error", message="todo not found")
     if "title" in request.form:
         title = request.form['title']
@@ -120,65 +163,156 @@ def edit_todo(id):
     if "description" in request.form:
         description = request.form['description']
         todo.description = description
+    todo.version = Todo.version + 1
+    touch(current_user.id)
     db.session.commit()
     return jsonify(result="success")
 
 
+@app.route('/api/todo/edits', methods=['POST'])
+@login_required
+def edit_todos():
+    updates = (request.get_json(silent=True) or {}).get('edits')
+    if not isinstance(updates, list) or not updates:
+        return jsonify(result="error", message="expected a list of edits"), 400
+    if len(updates) > app.config['BATCH_MAX_OPERATIONS']:
+        return jsonify(result="error", message="too many edits"), 400
+
+    # Several edits to the same todo collapse into one; the last value sent
+    # for a field wins.
+    edits = {}
+    for update in updates:
+        try:
+            todo_id, field, value, version = (int(update['todo_id']), update['field'],
+                                              update['value'], int(update['version']))
+        except (KeyError, TypeError, ValueError):
+            return jsonify(result="error", message="malformed edit"), 400
+        if field not in ('title', 'description') or not isinstance(value, str):
+            return jsonify(result="error", message=f"cannot edit {field}"), 400
+        if len(value) > Todo.__table__.c[field].type.length or (field == 'title' and value == ''):
+            return jsonify(result="error", message=f"invalid {field}"), 400
+        if edits.setdefault(todo_id, (version, {}))[0] != version:
+            return jsonify(result="error", message="conflicting versions"), 400
+        edits[todo_id][1][field] = value
+
+    saved, conflicts, missing = Todo.apply_edits(current_user.id, edits)
+    db.session.commit()
+    return jsonify(result="success", saved=saved, conflicts=conflicts, missing=missing)
+
+
 @app.route('/todo/<id>/like', methods=['GET'])
 @login_required
 def like_todo(id):
-    todo = Todo.query.get(int(id))
-    if todo is None:
-        return redirect(url_for('todo'))
-    if todo.has_liked(current_user):
-        return redirect(url_for('todo'))
-    db.session.add(TodoReaction(user_id=current_user.id, todo_id=todo.id))
-    creator = User.query.get(todo.user_id)
-    if creator != current_user:
-        creator.add_notification(actor=current_user,
-                                 body="{actor_username} liked your completed task <strong>" + todo.title + "</strong>")
-    db.session.commit()
+    perform_and_commit('like', todo_id=id)
     return redirect(url_for('todo'))
 
 
 @app.route('/todo/<id>/unlike', methods=['GET'])
 @login_required
 def unlike_todo(id):
-    todo = Todo.query.get(int(id))
-    if todo is None:
-        return redirect(url_for('todo'))
-    reaction = TodoReaction.query.filter_by(user_id=current_user.id, todo_id=todo.id).first()
-    if reaction is None:
-        return redirect(url_for('todo'))
-    db.session.delete(reaction)
-    db.session.commit()
+    perform_and_commit('unlike', todo_id=id)
     return redirect(url_for('todo'))
 
 
 @app.route('/todo/<id>/delete', methods=['GET'])
 @login_required
 def delete_todo(id):
-    todo = Todo.query.get(int(id))
-    if todo.user_id != current_user.id:
-        return redirect(url_for('todo'))
-    current_user.add_timeline(f"Deleted task <strong>{todo.title}</strong>")
-    db.session.delete(todo)
-    db.session.commit()
+    perform_and_commit('delete', todo_id=id)
     return redirect(url_for('todo'))
 
 
+def perform_and_commit(name, **args):
+    try:
+        state = perform(current_user, name, args)
+    except InvalidAction as error:
+        db.session.rollback()
+        if error.status == 404:
+            abort(404)
+        return None
+    db.session.commit()
+    return state
+
+
+@app.route('/api/todo/<id>/<any(complete, like, unlike, delete):name>', methods=['POST'])
+@login_required
+def api_todo_action(id, name):
+    return api_perform([{'action': name, 'todo_id': id}])
+
+
+@app.route('/api/user/<username>/<any(follow, unfollow):name>', methods=['POST'])
+@login_required
+def api_user_action(username, name):
+    return api_perform([{'action': name, 'username': username}])
+
+
+@app.route('/api/batch', methods=['POST'])
+@login_required
+def api_batch():
+    operations = (request.get_json(silent=True) or {}).get('operations')
+    if not isinstance(operations, list) or not operations:
+        return jsonify(result="error", message="expected a list of operations"), 400
+    if len(operations) > app.config['BATCH_MAX_OPERATIONS']:
+        return jsonify(result="error", message="too many operations"), 400
+    return api_perform(operations, batch=True)
+
+
+def api_perform(operations, batch=False):
+    # All operations share one transaction: if any of them fails, none of
+    # them are applied.
+    results = []
+    for index, operation in enumerate(operations):
+        try:
+            if not isinstance(operation, dict):
+                raise InvalidAction("expected an object")
+            args = dict(operation)
+            results.append(perform(current_user, args.pop('action', None), args))
+        except InvalidAction as error:
+            db.session.rollback()
+            body = {'result': "error", 'message': error.message}
+            if batch:
+                body['index'] = index
+            return jsonify(body), error.status
+    db.session.commit()
+    if batch:
+        return jsonify(result="success", results=results)
+    return jsonify(result="success", **results[0])
+
+
 @app.route('/profile/<username>')
 @login_required
+@replica_reads
 def profile(username):
-    user = User.query.filter_by(username=username).first_or_404()
-    return render_template('profile.html', user=user, users=User.query.all())
+    def render():
+        user = User.query.filter_by(username=username).first_or_404()
+        return render_template('profile.html', user=user)
+
+    last_modified = User.profile_watermark(current_user.id, username)
+    if last_modified is None:
+        return render()
+    return conditional_page(last_modified, render, current_user.id, username)
+
+
+@app.route('/api/users')
+@login_required
+@replica_reads
+def search_users():
+    prefix = request.args.get('q', '').strip()
+    if prefix == '':
+        return jsonify(users=[])
+    limit = app.config['USER_SEARCH_LIMIT']
+    entries = [entry for entry in directory.search(prefix, limit + 1) if entry.id != current_user.id]
+    return jsonify(users=[{'username': entry.username,
+                           'name': entry.name,
+                           'avatar': avatar_url(entry.avatar),
+                           'url': url_for('profile', username=entry.username)}
+                          for entry in entries[:limit]])
 
 
 @app.route('/edit-profile', methods=['GET', 'POST'])
 @login_required
 def edit_profile():
     if request.method == 'GET':
-        return render_template('editProfile.html', users=User.query.all())
+        return render_template('editProfile.html')
     bio = request.form['bio']
     first_name = request.form['first_name']
     last_name = request.form['last_name']
@@ -187,69 +321,87 @@ def edit_profile():
 
     existing_user = User.query.filter_by(username=username).first()
     if existing_user is not None and existing_user != current_user:
-        return render_template('editProfile.html', error='That username is already in use', users=User.query.all())
+        return render_template('editProfile.html', error='That username is already in use')
 
     existing_user = User.query.filter_by(email=email).first()
     if existing_user is not None and existing_user != current_user:
-        return render_template('editProfile.html', error='That email is already in use', users=User.query.all())
+        return render_template('editProfile.html', error='That email is already in use')
 
     avatar = request.files.get('avatar', None)
     if avatar:
         if not save_avatar(avatar):
-            return render_template('editProfile.html', error='Please upload a valid image', users=User.query.all())
+            return render_template('editProfile.html', error='Please upload a valid image')
 
     current_user.bio = bio
     current_user.first_name = first_name
     current_user.last_name = last_name
     current_user.email = email
     current_user.username = username
+    current_user.last_modified = datetime.utcnow()
+    fragments.invalidate('nav', current_user.id)
     db.session.commit()
+    directory.invalidate()
+    invalidate_user(current_user.id)
 
     return redirect(url_for('profile', username=current_user.username))
 
 
 def save_avatar(file):
-    random_hex = secrets.token_hex(10)
-    _, file_ext = os.path.splitext(file.filename)
-    if file_ext not in ['.jpeg', '.png', '.jpg']:
+    try:
+        current_user.avatar = store_avatar(file)
+    except InvalidImage:
         return False
-    picture_fn = random_hex + file_ext
-    path = app.config['AVATARS_SAVE_PATH']
-    file.save(os.path.join(path, picture_fn))
-    current_user.avatar = url_for('get_avatar', filename=picture_fn)
     return True
 
 
 @app.route('/follow/<username>')
 @login_required
 def follow(username):
-    user = User.query.filter_by(username=username).first_or_404()
-    if user == current_user:
-        return redirect(url_for('profile', username=username))
-    current_user.follow(user)
-    db.session.commit()
+    perform_and_commit('follow', username=username)
     return redirect(url_for('profile', username=username))
 
 
 @app.route('/unfollow/<username>')
 @login_required
 def unfollow(username):
-    user = User.query.filter_by(username=username).first_or_404()
-    if user == current_user:
-        return redirect(url_for('profile', username=username))
-    current_user.unfollow(user)
-    db.session.commit()
+    perform_and_commit('unfollow', username=username)
     return redirect(url_for('profile', username=username))
 
 
+@app.route('/events')
+@login_required
+def events():
+    return Response(stream(current_user.id), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
 @app.route('/read-notifications', methods=['POST'])
 @login_required
 def read_notifications():
-    current_user.last_notification_read_time = datetime.utcnow()
+    current_user.read_notifications()
     db.session.commit()
     return jsonify(result="success")
 
 
+@app.route('/metrics')
+@login_required
+def metrics():
+    if not instrumentation.enabled:
+        abort(404)
+    if current_user.username not in app.config['ADMIN_USERNAMES']:
+        abort(403)
+    return Response(instrumentation.render_metrics(), mimetype='text/plain; version=0.0.4')
+
+
+@app.after_request
+def add_user_cache_header(response):
+    if app.config['USER_CACHE_DEBUG_HEADER'] and 'users' in g:
+        lookups = g.user_cache_hits + g.user_cache_misses
+        rate = g.user_cache_hits / lookups if lookups else 0
+        response.headers['X-User-Cache'] = f"hits={g.user_cache_hits}; misses={g.user_cache_misses}; rate={rate:.2f}"
+    return response
+
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('404.html'), 404
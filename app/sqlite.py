@@ -0,0 +1,95 @@
+import sqlite3
+import threading
+import time
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+READ_PREFIXES = ('SELECT', 'PRAGMA', 'WITH', 'EXPLAIN')
+
+
+class WriterLock(object):
+    # SQLite allows a single writer at a time. Rather than letting every
+    # worker race for the database lock and fail with "database is locked",
+    # writers queue here: a thread lock within the process and an advisory
+    # file lock across gunicorn workers. The file lock is polled rather than
+    # blocked on so greenlet workers keep serving other requests meanwhile.
+
+    def __init__(self, path, poll_interval=0.002):
+        self.path = path
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._file = None
+
+    def acquire(self):
+        self._lock.acquire()
+        if fcntl is None:
+            return
+        self._file = open(self.path, 'a')
+        while True:
+            try:
+                fcntl.flock(self._file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return
+            except BlockingIOError:
+                time.sleep(self.poll_interval)
+
+    def release(self):
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+        self._lock.release()
+
+
+class SQLiteTuning(object):
+
+    def __init__(self, app=None):
+        self.writer_locks = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if not app.config['SQLITE_TUNING']:
+            return
+        self.pragmas = app.config['SQLITE_PRAGMAS']
+        event.listen(Pool, 'connect', self._on_connect)
+        event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(Engine, 'commit', self._release)
+        event.listen(Engine, 'rollback', self._release)
+        event.listen(Pool, 'reset', self._on_reset)
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        if not isinstance(dbapi_connection, sqlite3.Connection):
+            return
+        cursor = dbapi_connection.cursor()
+        for name, value in self.pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+
+    def _writer_lock(self, database):
+        return self.writer_locks.setdefault(database, WriterLock(database + '-writer.lock'))
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        database = conn.engine.url.database
+        if conn.engine.dialect.name != 'sqlite' or not database or database == ':memory:':
+            return
+        if 'writer_lock' in conn.info or statement.lstrip().upper().startswith(READ_PREFIXES):
+            return
+        lock = self._writer_lock(database)
+        lock.acquire()
+        conn.info['writer_lock'] = lock
+
+    def _release(self, conn):
+        lock = conn.info.pop('writer_lock', None)
+        if lock is not None:
+            lock.release()
+
+    def _on_reset(self, dbapi_connection, connection_record):
+        lock = connection_record.info.pop('writer_lock', None)
+        if lock is not None:
+            lock.release()
@@ -21,59 +21,151 @@ window.onload = function () {
         addFocusOut(this)
     })
 
-    $(".feed-item img").on("click", function () {
-        let id = $(this).closest(".feed-item").attr("todo-id");
-        let src = this.src;
-        if (src.endsWith("heart.png")) {
-            return window.location.replace(`/todo/${id}/like`)
-        }
-        window.location.replace(`/todo/${id}/unlike`)
+    function refreshFeed() {
+        $.get("/feed", function (html) {
+            $(".feed").children(".feed-item, .load-more, .empty-message").remove();
+            $(".feed").append(html);
+        })
+    }
+
+    function postAction(url, success) {
+        $.ajax({
+            url: url,
+            type: "POST",
+            dataType: "json",
+            success: success,
+            error: function () {
+                alert("An error occurred while trying to update your todo.")
+            }
+        })
+    }
+
+    function removeTodo(item) {
+        item.remove();
+        if ($(".todo-item").length === 0)
+            $(".todo-list").append("<p class='empty-message' id='todos-empty'>No todos</p>");
+    }
+
+    if (window.eventSource) {
+        window.eventSource.addEventListener("feed", refreshFeed)
+    }
+
+    $(".feed").on("click", ".load-more", function (event) {
+        event.preventDefault();
+        let link = $(this);
+        $.get("/feed", {cursor: link.data("cursor")}, function (html) {
+            link.replaceWith(html);
+        })
+    })
+
+    $(".feed").on("click", ".feed-item img[data-liked]", function () {
+        let heart = $(this);
+        let id = heart.closest(".feed-item").attr("todo-id");
+        let action = heart.attr("data-liked") === "true" ? "unlike" : "like";
+        postAction(`/api/todo/${id}/${action}`, function (data) {
+            heart.attr("data-liked", data.liked ? "true" : "false");
+            heart.attr("src", heart.data(data.liked ? "heart-liked" : "heart"));
+            heart.siblings(".like-count").text(data.like_count || "");
+        })
     })
 
     $(".todo-item .button4").on("click", function () {
-        let id = $(this).closest(".todo-item").attr("todo-id");
+        let item = $(this).closest(".todo-item");
         if (confirm("Are you sure you want to delete this todo?")) {
-            window.location.replace(`/todo/${id}/delete`)
+            postAction(`/api/todo/${item.attr("todo-id")}/delete`, function () {
+                removeTodo(item);
+            })
         }
     })
 
-    $(".todo-item .checkbox").on("click", function () {
-        let id = $(this).closest(".todo-item").attr("todo-id");
-        if (confirm("Are you sure you want to mark this todo as completed?")) {
-            window.location.replace(`/todo/${id}/complete`)
+    $(".todo-item .checkbox").on("click", function (event) {
+        let item = $(this).closest(".todo-item");
+        if (!confirm("Are you sure you want to mark this todo as completed?")) {
+            return event.preventDefault();
         }
+        postAction(`/api/todo/${item.attr("todo-id")}/complete`, function () {
+            removeTodo(item);
+            if (!window.eventSource)
+                refreshFeed();
+        })
     })
 
-    $(".todo-item .heading").on("change", function () {
-        let id = $(this).closest(".todo-item").attr("todo-id");
-        let title = this.innerText;
-        let formData = new FormData();
-        formData.append("title", title);
-        pushUpdate(formData, id);
-    })
+    // Edits are queued per todo and field, so retyping a title only sends
+    // its final value, and everything pending goes out in one request.
+    const pendingEdits = {};
+    let editTimer = null;
+    let editInFlight = false;
 
+    function queueEdit(item, field, value) {
+        let id = item.attr("todo-id");
+        pendingEdits[id] = pendingEdits[id] || {};
+        pendingEdits[id][field] = value;
+        clearTimeout(editTimer);
+        editTimer = setTimeout(flushEdits, 1000);
+    }
 
-    $(".todo-item .notes").on("change", function () {
-        let id = $(this).closest(".todo-item").attr("todo-id");
-        let description = this.innerText;
-        let formData = new FormData();
-        formData.append("description", description);
-        pushUpdate(formData, id);
-    })
+    function takeEdits() {
+        let edits = [];
+        for (let id in pendingEdits) {
+            let version = $(`.todo-item[todo-id="${id}"]`).attr("data-version");
+            for (let field in pendingEdits[id]) {
+                edits.push({todo_id: id, field: field, value: pendingEdits[id][field], version: version});
+            }
+            delete pendingEdits[id];
+        }
+        return edits;
+    }
 
-    function pushUpdate(formData, id) {
+    function flushEdits() {
+        if (editInFlight) {
+            editTimer = setTimeout(flushEdits, 200);
+            return;
+        }
+        let edits = takeEdits();
+        if (edits.length === 0)
+            return;
+        editInFlight = true;
         $.ajax({
-            url: `/todo/${id}/edit`,
+            url: "/api/todo/edits",
             type: "POST",
-            data: formData,
-            processData: false,
-            contentType: false,
-            success: function (response) {
-                let data = JSON.parse(response);
-                if (data.result !== "success")
-                    return alert("An error occurred while trying to update your todo.")
+            contentType: "application/json",
+            data: JSON.stringify({edits: edits}),
+            dataType: "json",
+            success: function (data) {
+                data.saved.forEach(function (todo) {
+                    $(`.todo-item[todo-id="${todo.id}"]`).attr("data-version", todo.version);
+                })
+                data.conflicts.forEach(function (todo) {
+                    let item = $(`.todo-item[todo-id="${todo.id}"]`);
+                    item.attr("data-version", todo.version);
+                    item.find(".heading").text(todo.title);
+                    item.find(".notes").text(todo.description);
+                })
+                if (data.conflicts.length || data.missing.length)
+                    alert("Some of your changes could not be saved because the todo was changed elsewhere.")
+            },
+            error: function () {
+                alert("An error occurred while trying to update your todo.")
+            },
+            complete: function () {
+                editInFlight = false;
             }
         })
     }
 
+    window.addEventListener("pagehide", function () {
+        let edits = takeEdits();
+        if (edits.length)
+            navigator.sendBeacon("/api/todo/edits",
+                new Blob([JSON.stringify({edits: edits})], {type: "application/json"}));
+    })
+
+    $(".todo-item .heading").on("change", function () {
+        queueEdit($(this).closest(".todo-item"), "title", this.innerText);
+    })
+
+    $(".todo-item .notes").on("change", function () {
+        queueEdit($(this).closest(".todo-item"), "description", this.innerText);
+    })
+
 }
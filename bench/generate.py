@@ -0,0 +1,143 @@
+"""Populate the configured database with a synthetic social graph.
+
+    DATABASE_URL=sqlite:////tmp/bench.db python -m bench.generate --users 10000 --reset
+
+Follows are drawn by preferential attachment over a Zipf popularity curve, so
+a few accounts collect most of the followers the way they do in production.
+Every generated user has the password "password". Rows are written with
+chunked Core inserts, and the feed table and counters are rebuilt at the end.
+"""
+import argparse
+import random
+from datetime import datetime, timedelta
+from itertools import accumulate
+from hackiethon import app
+from app import db
+from app.models import User, Todo, TodoReaction, Notification, Timeline, FeedEntry, followers, rebuild_counters
+from app.data import insert_chunked
+from app.passwords import hash_password
+
+
+class Graph(object):
+
+    def __init__(self, users, mean_following, zipf_exponent, rng):
+        self.users = users
+        self.rng = rng
+        self.mean_following = mean_following
+        # Lower ids are the popular accounts.
+        self.ids = range(1, users + 1)
+        self.cum_weights = list(accumulate(1 / rank ** zipf_exponent for rank in self.ids))
+
+    def popular(self, k):
+        return self.rng.choices(self.ids, cum_weights=self.cum_weights, k=k)
+
+    def following_count(self):
+        # Pareto-distributed out-degree with the requested mean.
+        alpha = 2.0
+        scale = self.mean_following * (alpha - 1) / alpha
+        return min(self.users - 1, int(scale * self.rng.paretovariate(alpha)))
+
+    def follows(self):
+        for follower_id in self.ids:
+            targets = set(self.popular(self.following_count()))
+            targets.discard(follower_id)
+            for followed_id in targets:
+                yield follower_id, followed_id
+
+
+def generate(users, mean_following, zipf_exponent, todos_per_user, completed_ratio, mean_likes,
+             notification_ratio, chunk_size, seed):
+    rng = random.Random(seed)
+    graph = Graph(users, mean_following, zipf_exponent, rng)
+    now = datetime.utcnow()
+    password_hash = hash_password('password')
+
+    def user_rows():
+        for id in graph.ids:
+            yield {'id': id, 'username': f'user{id}', 'first_name': f'User{id}', 'last_name': 'Bench',
+                   'email': f'user{id}@bench.invalid', 'password_hash': password_hash}
+
+    print('users', insert_chunked(User.__table__, user_rows(), chunk_size))
+
+    notifications = []
+
+    def follow_rows():
+        for follower_id, followed_id in graph.follows():
+            if rng.random() < notification_ratio:
+                notifications.append({'user_id': followed_id, 'actor_id': follower_id,
+                                      'timestamp': now - timedelta(minutes=rng.randrange(43200)),
+                                      'body': '{actor_name} has started following you',
+                                      'rendered': f'User{follower_id} B has started following you'})
+                if len(notifications) >= chunk_size:
+                    db.session.execute(Notification.__table__.insert(), notifications)
+                    notifications.clear()
+            yield {'follower_id': follower_id, 'followed_id': followed_id}
+
+    print('follows', insert_chunked(followers, follow_rows(), chunk_size))
+    if notifications:
+        db.session.execute(Notification.__table__.insert(), notifications)
+
+    completed_ids = []
+
+    def todo_rows():
+        todo_id = 0
+        for user_id in graph.ids:
+            for _ in range(rng.randint(0, 2 * todos_per_user)):
+                todo_id += 1
+                created_at = now - timedelta(minutes=rng.randrange(43200))
+                completed = rng.random() < completed_ratio
+                if completed:
+                    completed_ids.append(todo_id)
+                yield {'id': todo_id, 'user_id': user_id, 'title': f'Task {todo_id}',
+                       'description': 'Generated by bench.generate', 'created_at': created_at,
+                       'completed': completed,
+                       'completed_at': created_at + timedelta(minutes=rng.randrange(1440)) if completed else None}
+
+    print('todos', insert_chunked(Todo.__table__, todo_rows(), chunk_size))
+
+    def reaction_rows():
+        for todo_id in completed_ids:
+            for user_id in set(graph.popular(int(rng.expovariate(1 / mean_likes)))):
+                yield {'todo_id': todo_id, 'user_id': user_id}
+
+    print('reactions', insert_chunked(TodoReaction.__table__, reaction_rows(), chunk_size))
+
+    timeline = Timeline.__table__
+    db.session.execute(timeline.insert().from_select(
+        ['user_id', 'timestamp', 'body'],
+        db.select([Todo.user_id, Todo.created_at, db.literal('Created a new task <strong>') + Todo.title +
+                   db.literal('</strong>')])))
+    db.session.execute(timeline.insert().from_select(
+        ['user_id', 'timestamp', 'body'],
+        db.select([Todo.user_id, Todo.completed_at, db.literal('Completed task <strong>') + Todo.title +
+                   db.literal('</strong>')]).where(Todo.completed.is_(True))))
+
+    rebuild_counters()
+    FeedEntry.rebuild()
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--mean-following', type=float, default=50)
+    parser.add_argument('--zipf-exponent', type=float, default=1.0)
+    parser.add_argument('--todos-per-user', type=int, default=10)
+    parser.add_argument('--completed-ratio', type=float, default=0.6)
+    parser.add_argument('--mean-likes', type=float, default=3)
+    parser.add_argument('--notification-ratio', type=float, default=0.2)
+    parser.add_argument('--chunk-size', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--reset', action='store_true', help='drop and recreate every table first')
+    args = parser.parse_args()
+
+    with app.app_context():
+        if args.reset:
+            db.drop_all()
+            db.create_all()
+        generate(args.users, args.mean_following, args.zipf_exponent, args.todos_per_user,
+                 args.completed_ratio, args.mean_likes, args.notification_ratio, args.chunk_size, args.seed)
+
+
+if __name__ == '__main__':
+    main()
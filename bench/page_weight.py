@@ -0,0 +1,59 @@
+"""Count the bytes a browser downloads for one /todo view, cold and warm.
+
+    python -m bench.page_weight --username alice --password secret
+
+The cold view fetches the page and every local stylesheet, script and image it
+references. The warm view replays those requests the way a browser with a
+primed cache would: immutable URLs are skipped entirely and everything else is
+revalidated with If-None-Match. Run 'flask assets compress' first so the
+precompressed variants are served.
+"""
+import argparse
+import re
+from hackiethon import app
+
+ASSET_PATTERN = re.compile(r'''(?:src|href)=['"]\s*(/(?:static|avatars)/[^'"\s]+)\s*['"]''')
+
+
+def fetch(client, url, etags, warm):
+    headers = {'Accept-Encoding': 'gzip, br'}
+    if warm:
+        cached = etags.get(url)
+        if cached is None:
+            pass
+        elif 'immutable' in cached[1]:
+            return None
+        else:
+            headers['If-None-Match'] = cached[0]
+    response = client.get(url, headers=headers)
+    etags[url] = (response.headers.get('ETag', ''), response.headers.get('Cache-Control', ''))
+    return len(response.get_data())
+
+
+def view(client, etags, warm):
+    page = client.get('/todo')
+    total, requests = len(page.get_data()), 1
+    for url in sorted(set(ASSET_PATTERN.findall(page.get_data(as_text=True)))):
+        size = fetch(client, url, etags, warm)
+        if size is not None:
+            total += size
+            requests += 1
+    return total, requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--username', required=True)
+    parser.add_argument('--password', required=True)
+    args = parser.parse_args()
+
+    with app.test_client() as client:
+        client.post('/login', data={'username': args.username, 'password': args.password})
+        etags = {}
+        for name, warm in (('cold', False), ('warm', True)):
+            total, requests = view(client, etags, warm)
+            print(f"{name} view: {total} bytes in {requests} requests")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+"""Measure password verifications per second with and without the hashing pool.
+
+    python -m bench.passwords --threads 8 --logins 200
+
+Each thread stands in for a request thread calling User.check_password. The
+inline run shows the serialized baseline; the pooled run uses the configured
+PASSWORD_HASH_WORKERS process pool. The per-core rate divides by the cores a
+run could use: hashlib releases the GIL while hashing, so inline threads can
+spread across cores too.
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from hackiethon import app
+from app.passwords import hash_password, verify_password
+
+
+def run(threads, logins):
+    pwhash = hash_password('correct horse battery staple')
+    started = time.monotonic()
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(lambda _: verify_password(pwhash, 'correct horse battery staple'), range(logins)))
+    return logins / (time.monotonic() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--logins', type=int, default=200)
+    args = parser.parse_args()
+
+    workers = app.config['PASSWORD_HASH_WORKERS'] or os.cpu_count()
+    print(f"method: {app.config['PASSWORD_HASH_METHOD']}")
+    print(f"cores: {os.cpu_count()}")
+    for label, pool_size in (('inline', 0), ('pooled', workers)):
+        app.config['PASSWORD_HASH_WORKERS'] = pool_size
+        rate = run(args.threads, args.logins)
+        cores = min(pool_size or args.threads, os.cpu_count())
+        print(f"{label:>7}: {rate:8.1f} logins/s, {rate / cores:8.1f} logins/s per core")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""Replay request scenarios and write a comparable JSON latency report.
+
+    python -m bench.scenarios --requests 500 --output report.json
+    python -m bench.scenarios --url http://127.0.0.1:8000 --output report.json
+
+Without --url the Flask test client is used and queries are counted from
+engine events. With --url a running server is measured instead; queries per
+request are then read from its Server-Timing header, so start it with
+SQL_INSTRUMENTATION=1 SQL_SERVER_TIMING=1.
+"""
+import argparse
+import json
+import random
+import re
+import statistics
+import sys
+import time
+from http.cookiejar import CookieJar
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import build_opener, HTTPCookieProcessor, HTTPRedirectHandler
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from hackiethon import app
+from app import db
+from app.models import User, Todo
+
+SERVER_TIMING_QUERIES = re.compile(r'desc="(\d+) queries"')
+
+
+class TestClientTransport(object):
+
+    def __init__(self):
+        self.queries = 0
+        event.listen(Engine, 'after_cursor_execute', self._count)
+
+    def _count(self, *args):
+        self.queries += 1
+
+    def session(self, username, password):
+        client = app.test_client()
+        client.post('/login', data={'username': username, 'password': password})
+        return client
+
+    def get(self, client, path):
+        self.queries = 0
+        started = time.perf_counter()
+        response = client.get(path)
+        return response.status_code, time.perf_counter() - started, self.queries
+
+
+class NoRedirect(HTTPRedirectHandler):
+
+    def redirect_request(self, *args):
+        return None
+
+
+class HttpTransport(object):
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+
+    def session(self, username, password):
+        opener = build_opener(HTTPCookieProcessor(CookieJar()), NoRedirect())
+        try:
+            opener.open(self.base_url + '/login', data=urlencode({'username': username, 'password': password}).encode())
+        except HTTPError:
+            pass
+        return opener
+
+    def get(self, opener, path):
+        started = time.perf_counter()
+        try:
+            response = opener.open(self.base_url + path)
+            response.read()
+        except HTTPError as error:
+            response = error
+        duration = time.perf_counter() - started
+        match = SERVER_TIMING_QUERIES.search(response.headers.get('Server-Timing', ''))
+        return response.status, duration, int(match.group(1)) if match else None
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def summarize(samples):
+    latencies = [duration * 1000 for _, duration, _ in samples]
+    queries = [count for _, _, count in samples if count is not None]
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for status, _, _ in samples if status >= 400),
+        'p50_ms': round(percentile(latencies, 0.50), 2),
+        'p95_ms': round(percentile(latencies, 0.95), 2),
+        'p99_ms': round(percentile(latencies, 0.99), 2),
+        'queries_mean': round(statistics.mean(queries), 2) if queries else None,
+        'queries_max': max(queries) if queries else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url')
+    parser.add_argument('--requests', type=int, default=200, help='requests per scenario')
+    parser.add_argument('--sessions', type=int, default=10)
+    parser.add_argument('--password', default='password')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with app.app_context():
+        usernames = [username for username, in db.session.query(User.username)]
+        todo_ids = [id for id, in db.session.query(Todo.id).filter(Todo.completed.is_(True))
+                    .order_by(db.func.random()).limit(args.requests * 4)]
+
+    transport = HttpTransport(args.url) if args.url else TestClientTransport()
+    sessions = [transport.session(username, args.password)
+                for username in rng.sample(usernames, min(args.sessions, len(usernames)))]
+
+    scenarios = {
+        'todo': lambda: '/todo',
+        'profile': lambda: f'/profile/{rng.choice(usernames)}',
+        'like': lambda: f'/todo/{rng.choice(todo_ids)}/like',
+        'follow': lambda: f'/follow/{rng.choice(usernames)}',
+    }
+    report = {'meta': {'target': args.url or 'test-client', 'users': len(usernames),
+                       'requests_per_scenario': args.requests, 'seed': args.seed}}
+    for name, path in scenarios.items():
+        samples = [transport.get(sessions[i % len(sessions)], path()) for i in range(args.requests)]
+        report[name] = summarize(samples)
+
+    output = open(args.output, 'w') if args.output else sys.stdout
+    json.dump(report, output, indent=2, sort_keys=True)
+    output.write('\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""Compare SQLite write throughput with and without the tuning mode.
+
+    DATABASE_URL=sqlite:////tmp/bench.db python -m bench.sqlite_writes --processes 8 --writes 200
+
+Each process stands in for a gunicorn worker. Each write is shaped like
+completing a todo: a read, a fan-out insert of --fanout rows, then a counter
+update, with --think seconds of request work between the statements while the
+transaction is open. The run is repeated with SQLITE_TUNING=0 (rollback
+journal, no writer lock) and SQLITE_TUNING=1, reporting commits per second,
+"database is locked" failures and the slowest commit for each.
+"""
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import time
+
+
+def writer(writes, fanout, think):
+    from datetime import datetime
+    from sqlalchemy.exc import OperationalError
+    from hackiethon import app
+    from app import db
+    from app.models import Timeline, User
+
+    failures = 0
+    slowest = 0
+    with app.app_context():
+        user_ids = [id for id, in db.session.query(User.id).order_by(User.id).limit(fanout)]
+        db.session.commit()
+        for i in range(writes):
+            started = time.monotonic()
+            try:
+                User.query.get(user_ids[i % len(user_ids)])
+                time.sleep(think)
+                db.session.execute(Timeline.__table__.insert(), [
+                    {'user_id': user_id, 'body': f'bench write {i}', 'timestamp': datetime.utcnow()}
+                    for user_id in user_ids])
+                time.sleep(think)
+                db.session.execute(User.__table__.update().where(User.id == user_ids[i % len(user_ids)])
+                                   .values(last_modified=datetime.utcnow()))
+                db.session.commit()
+            except OperationalError:
+                db.session.rollback()
+                failures += 1
+            slowest = max(slowest, time.monotonic() - started)
+    return failures, slowest
+
+
+def run(database, tuning, processes, writes, fanout, think):
+    os.environ['SQLITE_TUNING'] = '1' if tuning else '0'
+    if not tuning:
+        # journal_mode=WAL is stored in the file, so undo an earlier tuned run.
+        sqlite3.connect(database).execute('PRAGMA journal_mode=DELETE').close()
+    context = multiprocessing.get_context('spawn')
+    started = time.monotonic()
+    with context.Pool(processes) as pool:
+        results = pool.starmap(writer, [(writes, fanout, think)] * processes)
+    elapsed = time.monotonic() - started
+    failures = sum(failed for failed, _ in results)
+    return (processes * writes - failures) / elapsed, failures, max(slowest for _, slowest in results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--processes', type=int, default=8)
+    parser.add_argument('--writes', type=int, default=200)
+    parser.add_argument('--fanout', type=int, default=50)
+    parser.add_argument('--think', type=float, default=0.005)
+    args = parser.parse_args()
+
+    from hackiethon import app
+    database = app.config['SQLALCHEMY_DATABASE_URI'].split('///', 1)[1]
+    for tuning in (False, True):
+        rate, failures, slowest = run(database, tuning, args.processes, args.writes, args.fanout, args.think)
+        print(f"tuning={'on ' if tuning else 'off'} {rate:8.1f} commits/s, {failures} locked errors, "
+              f"slowest {slowest * 1000:.0f} ms")
+
+    from app import db
+    from app.models import Timeline
+    with app.app_context():
+        Timeline.query.filter(Timeline.body.like('bench write %')).delete(synchronize_session=False)
+        db.session.commit()
+
+
+if __name__ == '__main__':
+    main()
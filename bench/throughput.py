@@ -0,0 +1,87 @@
+"""Measure request throughput of a running server at several concurrency levels.
+
+Start the server with the worker class under test, then point this script at it:
+
+    GUNICORN_WORKER_CLASS=sync gunicorn hackiethon:app --bind 127.0.0.1:8000
+    python -m bench.throughput http://127.0.0.1:8000/todo --username alice --password secret
+
+    GUNICORN_WORKER_CLASS=gevent gunicorn hackiethon:app --bind 127.0.0.1:8000
+    python -m bench.throughput http://127.0.0.1:8000/todo --username alice --password secret
+
+Compare the two tables; each row reports completed requests per second and
+latency percentiles for one level of concurrent clients.
+"""
+from gevent import monkey
+
+monkey.patch_all()
+
+import argparse
+import time
+from http.cookiejar import CookieJar
+from urllib.error import URLError
+from urllib.parse import urlencode, urlsplit
+from urllib.request import build_opener, HTTPCookieProcessor
+from gevent.pool import Pool
+
+
+def login(base_url, username, password):
+    opener = build_opener(HTTPCookieProcessor(CookieJar()))
+    opener.open(base_url + '/login', data=urlencode({'username': username, 'password': password}).encode())
+    return opener
+
+
+def run_level(opener, url, clients, duration):
+    latencies = []
+    errors = 0
+    started_at = time.monotonic()
+    deadline = started_at + duration
+
+    def client():
+        nonlocal errors
+        while time.monotonic() < deadline:
+            started = time.monotonic()
+            try:
+                opener.open(url).read()
+            except (URLError, OSError):
+                errors += 1
+                continue
+            latencies.append(time.monotonic() - started)
+
+    pool = Pool(clients)
+    for _ in range(clients):
+        pool.spawn(client)
+    pool.join()
+    # Requests in flight at the deadline still complete, so the rate is taken
+    # over the time the level actually ran.
+    return latencies, errors, time.monotonic() - started_at
+
+
+def percentile(values, fraction):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('url')
+    parser.add_argument('--username')
+    parser.add_argument('--password')
+    parser.add_argument('--clients', type=int, nargs='+', default=[100, 500, 1000])
+    parser.add_argument('--duration', type=float, default=20)
+    args = parser.parse_args()
+
+    parts = urlsplit(args.url)
+    base_url = f"{parts.scheme}://{parts.netloc}"
+    opener = login(base_url, args.username, args.password) if args.username else build_opener()
+
+    print(f"{'clients':>8} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8}")
+    for clients in args.clients:
+        latencies, errors, elapsed = run_level(opener, args.url, clients, args.duration)
+        print(f"{clients:>8} {len(latencies):>9} {errors:>7} {len(latencies) / elapsed:>9.1f} "
+              f"{percentile(latencies, 0.5) * 1000:>8.1f} {percentile(latencies, 0.95) * 1000:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -8,4 +8,73 @@ class Config(object):
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
                               'sqlite:///' + os.path.join(basedir, 'app.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    RELEASE = os.environ.get('RELEASE') or ''
+    # Read replicas are ordinary binds; views decorated with replica_reads
+    # send their queries to them round-robin.
+    SQLALCHEMY_BINDS = {f'replica_{i}': url for i, url in
+                        enumerate(url for url in (os.environ.get('DATABASE_REPLICA_URLS') or '').split(',') if url)}
+    SQLALCHEMY_REPLICAS = sorted(SQLALCHEMY_BINDS)
+    REPLICA_HEALTH_INTERVAL = 10
+    REPLICA_STICKY_SECONDS = 5
+    # Only applied to SQLite connections: WAL lets readers proceed during a
+    # write, and writers are serialized by app.sqlite.WriterLock.
+    SQLITE_TUNING = os.environ.get('SQLITE_TUNING', '1') != '0'
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -64000,
+        'temp_store': 'MEMORY',
+    }
+    # SQLite files use a pool without size limits; every other backend gets a
+    # bounded pool shared by all the greenlets of a worker.
+    SQLALCHEMY_ENGINE_OPTIONS = {} if SQLALCHEMY_DATABASE_URI.startswith('sqlite') else {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE') or 10),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW') or 20),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT') or 10),
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE') or 1800),
+        'pool_pre_ping': True,
+    }
     AVATARS_SAVE_PATH = os.path.join(basedir, 'avatars')
+    AVATAR_SOURCES_PATH = os.path.join(basedir, 'avatar_sources')
+    AVATAR_FORMAT = os.environ.get('AVATAR_FORMAT') or 'WEBP'
+    AVATAR_RENDITIONS = {'small': 100, 'large': 300}
+    AVATAR_MAX_BYTES = 5 * 1024 * 1024
+    AVATAR_WORKERS = 2
+    FEED_PAGE_SIZE = int(os.environ.get('FEED_PAGE_SIZE') or 20)
+    PENDING_TODO_LIMIT = 200
+    BATCH_MAX_OPERATIONS = 50
+    FEED_FANOUT_LIMIT = int(os.environ.get('FEED_FANOUT_LIMIT') or 5000)
+    USER_DIRECTORY_CACHE_SIZE = int(os.environ.get('USER_DIRECTORY_CACHE_SIZE') or 1024)
+    USER_DIRECTORY_TTL = int(os.environ.get('USER_DIRECTORY_TTL') or 60)
+    USER_SEARCH_LIMIT = 10
+    EVENT_BROKER = os.environ.get('EVENT_BROKER') or 'local'
+    EVENT_BROKER_URL = os.environ.get('EVENT_BROKER_URL')
+    EVENT_QUEUE_SIZE = 100
+    EVENT_KEEPALIVE = 15
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD') or 'pbkdf2:sha256:260000'
+    PASSWORD_SALT_LENGTH = 16
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS') or 2)
+    USER_CACHE_SIZE = 10000
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL') or 0)
+    USER_CACHE_DEBUG_HEADER = bool(os.environ.get('USER_CACHE_DEBUG_HEADER'))
+    FRAGMENT_CACHE = os.environ.get('FRAGMENT_CACHE') or 'memory'
+    FRAGMENT_CACHE_DIR = os.environ.get('FRAGMENT_CACHE_DIR') or os.path.join(basedir, 'fragment_cache')
+    FRAGMENT_CACHE_SIZE = 5000
+    FRAGMENT_CACHE_TTL = 3600
+    SQL_INSTRUMENTATION = bool(os.environ.get('SQL_INSTRUMENTATION'))
+    SQL_SERVER_TIMING = bool(os.environ.get('SQL_SERVER_TIMING'))
+    SQL_N_PLUS_ONE_THRESHOLD = 5
+    ADMIN_USERNAMES = [username for username in (os.environ.get('ADMIN_USERNAMES') or '').split(',') if username]
+    TIMELINE_RETENTION_DAYS = int(os.environ.get('TIMELINE_RETENTION_DAYS') or 180)
+    NOTIFICATION_RETENTION_DAYS = int(os.environ.get('NOTIFICATION_RETENTION_DAYS') or 60)
+    RETENTION_KEEP_LATEST = 10
+    RETENTION_BATCH_SIZE = 1000
+    JOB_MODE = os.environ.get('JOB_MODE') or 'thread'
+    JOB_BATCH_SIZE = 100
+    JOB_MAX_ATTEMPTS = 5
+    JOB_POLL_INTERVAL = 1
+    JOB_RETENTION_HOURS = 24
+    JOB_PURGE_INTERVAL = 3600
+    JOB_LEASE_SECONDS = 300
@@ -0,0 +1,31 @@
+import multiprocessing
+import os
+
+# Greenlet workers by default: slow uploads, long feed queries and idle
+# /events streams only park a greenlet instead of tying up a whole worker.
+# Set GUNICORN_WORKER_CLASS=sync to run the old configuration.
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS') or 'gevent'
+
+if worker_class == 'sync':
+    workers = int(os.environ.get('WEB_CONCURRENCY') or multiprocessing.cpu_count() * 2 + 1)
+else:
+    workers = int(os.environ.get('WEB_CONCURRENCY') or multiprocessing.cpu_count())
+    worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS') or 1000)
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT') or 30)
+graceful_timeout = 30
+keepalive = 5
+max_requests = 2000
+max_requests_jitter = 200
+
+
+def post_fork(server, worker):
+    # psycopg2 blocks the whole worker on I/O unless it is told to yield to
+    # the gevent hub.
+    if worker_class != 'gevent':
+        return
+    try:
+        from psycogreen.gevent import patch_psycopg
+    except ImportError:
+        return
+    patch_psycopg()
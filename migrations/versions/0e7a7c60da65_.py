@@ -0,0 +1,24 @@
+"""todo version
+
+Revision ID: 0e7a7c60da65
+Revises: 92fc5db90adc
+Create Date: 2026-10-18 18:21:07.604913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0e7a7c60da65'
+down_revision = '92fc5db90adc'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('todo', sa.Column('version', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    op.drop_column('todo', 'version')
@@ -0,0 +1,28 @@
+"""notification counters
+
+Revision ID: 370008365a0a
+Revises: 93cdf3935e26
+Create Date: 2026-10-18 11:03:17.502144
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '370008365a0a'
+down_revision = '93cdf3935e26'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('user', sa.Column('unread_notifications', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('notification', sa.Column('rendered', sa.String(length=255), nullable=True))
+    op.add_column('notification', sa.Column('actor_avatar', sa.String(length=64), nullable=True))
+
+
+def downgrade():
+    op.drop_column('notification', 'actor_avatar')
+    op.drop_column('notification', 'rendered')
+    op.drop_column('user', 'unread_notifications')
@@ -0,0 +1,26 @@
+"""per-user timeline and notification indexes
+
+Revision ID: 3a22a55cc6af
+Revises: 68eed1bd473c
+Create Date: 2026-10-18 15:41:09.663127
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3a22a55cc6af'
+down_revision = '68eed1bd473c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_timeline_user_id_timestamp', 'timeline', ['user_id', 'timestamp'], unique=False)
+    op.create_index('ix_notification_user_id_timestamp', 'notification', ['user_id', 'timestamp'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_notification_user_id_timestamp', table_name='notification')
+    op.drop_index('ix_timeline_user_id_timestamp', table_name='timeline')
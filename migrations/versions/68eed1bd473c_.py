@@ -0,0 +1,38 @@
+"""like and follower counters
+
+Revision ID: 68eed1bd473c
+Revises: aaad7ec41537
+Create Date: 2026-10-18 14:08:33.214870
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '68eed1bd473c'
+down_revision = 'aaad7ec41537'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('todo', sa.Column('like_count', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('user', sa.Column('follower_count', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('user', sa.Column('following_count', sa.Integer(), nullable=False, server_default='0'))
+
+    user = sa.table('user', sa.column('id'), sa.column('follower_count'), sa.column('following_count'))
+    todo = sa.table('todo', sa.column('id'), sa.column('like_count'))
+    followers = sa.table('followers', sa.column('follower_id'), sa.column('followed_id'))
+    todo_reaction = sa.table('todo_reaction', sa.column('todo_id'))
+    op.execute(todo.update().values(like_count=sa.select([sa.func.count()])
+                                    .where(todo_reaction.c.todo_id == todo.c.id).scalar_subquery()))
+    op.execute(user.update().values(
+        follower_count=sa.select([sa.func.count()]).where(followers.c.followed_id == user.c.id).scalar_subquery(),
+        following_count=sa.select([sa.func.count()]).where(followers.c.follower_id == user.c.id).scalar_subquery()))
+
+
+def downgrade():
+    op.drop_column('user', 'following_count')
+    op.drop_column('user', 'follower_count')
+    op.drop_column('todo', 'like_count')
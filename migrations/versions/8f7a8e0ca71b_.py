@@ -0,0 +1,27 @@
+"""user last modified
+
+Revision ID: 8f7a8e0ca71b
+Revises: 0e7a7c60da65
+Create Date: 2026-10-18 19:44:31.902215
+
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8f7a8e0ca71b'
+down_revision = '0e7a7c60da65'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('user', sa.Column('last_modified', sa.DateTime(), nullable=True))
+    user = sa.table('user', sa.column('last_modified'))
+    op.execute(user.update().values(last_modified=datetime.utcnow()))
+
+
+def downgrade():
+    op.drop_column('user', 'last_modified')
@@ -0,0 +1,24 @@
+"""pending todo index
+
+Revision ID: 92fc5db90adc
+Revises: 3780098c5e63
+Create Date: 2026-10-18 17:02:58.318460
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '92fc5db90adc'
+down_revision = '3780098c5e63'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_todo_user_id_completed_created_at', 'todo', ['user_id', 'completed', 'created_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_todo_user_id_completed_created_at', table_name='todo')
@@ -0,0 +1,35 @@
+"""feed entries
+
+Revision ID: 93cdf3935e26
+Revises: c8c509af5578
+Create Date: 2026-10-18 10:12:40.118532
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '93cdf3935e26'
+down_revision = 'c8c509af5578'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('feed_entry',
+    sa.Column('owner_id', sa.Integer(), nullable=False),
+    sa.Column('completed_at', sa.DateTime(), nullable=False),
+    sa.Column('todo_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['owner_id'], ['user.id'], ),
+    sa.ForeignKeyConstraint(['todo_id'], ['todo.id'], ),
+    sa.PrimaryKeyConstraint('owner_id', 'completed_at', 'todo_id')
+    )
+    op.create_index(op.f('ix_feed_entry_todo_id'), 'feed_entry', ['todo_id'], unique=False)
+    op.add_column('user', sa.Column('fanout_on_read', sa.Boolean(), nullable=False, server_default=sa.false()))
+
+
+def downgrade():
+    op.drop_column('user', 'fanout_on_read')
+    op.drop_index(op.f('ix_feed_entry_todo_id'), table_name='feed_entry')
+    op.drop_table('feed_entry')
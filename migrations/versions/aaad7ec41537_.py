@@ -0,0 +1,62 @@
+"""follower and reaction constraints
+
+Revision ID: aaad7ec41537
+Revises: 370008365a0a
+Create Date: 2026-10-18 13:26:51.730914
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'aaad7ec41537'
+down_revision = '370008365a0a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # followers had no key, so it may hold duplicates; rebuild it from the
+    # distinct pairs with a composite primary key.
+    op.create_table('followers_new',
+    sa.Column('follower_id', sa.Integer(), nullable=False),
+    sa.Column('followed_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['followed_id'], ['user.id'], ),
+    sa.ForeignKeyConstraint(['follower_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('follower_id', 'followed_id')
+    )
+    op.execute('INSERT INTO followers_new (follower_id, followed_id) '
+               'SELECT DISTINCT follower_id, followed_id FROM followers '
+               'WHERE follower_id IS NOT NULL AND followed_id IS NOT NULL')
+    op.drop_table('followers')
+    op.rename_table('followers_new', 'followers')
+    op.create_index('ix_followers_followed_id', 'followers', ['followed_id'], unique=False)
+
+    op.execute('DELETE FROM todo_reaction WHERE id NOT IN '
+               '(SELECT keep_id FROM (SELECT MIN(id) AS keep_id FROM todo_reaction GROUP BY todo_id, user_id) AS keep)')
+    op.create_index('ix_todo_reaction_todo_id_user_id', 'todo_reaction', ['todo_id', 'user_id'], unique=True)
+
+    op.create_index('ix_todo_user_id_completed_completed_at', 'todo', ['user_id', 'completed', 'completed_at'], unique=False)
+
+    op.drop_index('ix_user_bio', table_name='user')
+    op.drop_index('ix_user_avatar', table_name='user')
+
+
+def downgrade():
+    op.create_index('ix_user_avatar', 'user', ['avatar'], unique=False)
+    op.create_index('ix_user_bio', 'user', ['bio'], unique=False)
+
+    op.drop_index('ix_todo_user_id_completed_completed_at', table_name='todo')
+    op.drop_index('ix_todo_reaction_todo_id_user_id', table_name='todo_reaction')
+
+    op.drop_index('ix_followers_followed_id', table_name='followers')
+    op.create_table('followers_old',
+    sa.Column('follower_id', sa.Integer(), nullable=True),
+    sa.Column('followed_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['followed_id'], ['user.id'], ),
+    sa.ForeignKeyConstraint(['follower_id'], ['user.id'], )
+    )
+    op.execute('INSERT INTO followers_old (follower_id, followed_id) SELECT follower_id, followed_id FROM followers')
+    op.drop_table('followers')
+    op.rename_table('followers_old', 'followers')
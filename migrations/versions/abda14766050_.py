@@ -0,0 +1,26 @@
+"""job claim
+
+Revision ID: abda14766050
+Revises: 8f7a8e0ca71b
+Create Date: 2026-10-19 10:12:44.271093
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'abda14766050'
+down_revision = '8f7a8e0ca71b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('job', sa.Column('claim', sa.String(length=32), nullable=True))
+    op.create_index(op.f('ix_job_claim'), 'job', ['claim'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_job_claim'), table_name='job')
+    op.drop_column('job', 'claim')
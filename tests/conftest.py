@@ -0,0 +1,89 @@
+import os
+import tempfile
+
+# Config is read when the app package is imported, so the test settings have
+# to be in the environment first.
+_workdir = tempfile.mkdtemp(prefix='sodo-tests-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_workdir, 'test.db')
+os.environ['JOB_MODE'] = 'worker'
+os.environ['FRAGMENT_CACHE'] = 'off'
+os.environ['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:1000'
+
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import event
+from app import app as flask_app, db
+from app.directory import directory
+from app.models import User, Todo, FeedEntry, user_cache
+
+
+@pytest.fixture
+def app():
+    flask_app.config['TESTING'] = True
+    with flask_app.app_context():
+        db.drop_all()
+        db.create_all()
+        user_cache.clear()
+        directory.invalidate()
+        yield flask_app
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def make_user(username, **columns):
+    user = User(username=username, first_name=username.title(), last_name='Test',
+                email=f'{username}@example.com', **columns)
+    db.session.add(user)
+    db.session.flush()
+    return user
+
+
+def make_todo(user, title, completed=False, completed_at=None):
+    todo = Todo(title=title, description='', user=user, completed=completed,
+                completed_at=completed_at or (datetime.utcnow() if completed else None))
+    db.session.add(todo)
+    db.session.flush()
+    if completed:
+        FeedEntry.fan_out(todo)
+    return todo
+
+
+def make_feed(viewer, authors, todos_per_author):
+    start = datetime.utcnow() - timedelta(days=1)
+    for author in authors:
+        viewer.follow(author)
+    for n in range(todos_per_author):
+        for author in authors:
+            make_todo(author, f'{author.username} {n}', completed=True,
+                      completed_at=start + timedelta(seconds=n * len(authors) + author.id))
+
+
+def login(client, user):
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user.id)
+        session['_fresh'] = True
+
+
+class QueryCounter(object):
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._record)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._record)
+
+    @property
+    def count(self):
+        return len(self.statements)
@@ -0,0 +1,48 @@
+import pytest
+from app import db
+from app.models import TodoReaction, User
+from conftest import make_user, make_todo, login
+
+
+@pytest.mark.parametrize('operation', [
+    {'action': []},
+    {'action': 'follow', 'username': ['alice']},
+    {'action': 'like', 'todo_id': {'id': 1}},
+    {'action': 'like', 'todo_id': True},
+    {'action': 'like', 'todo_id': 'one'},
+    {'action': 'like'},
+    {'action': 'like', 'todo_id': 1, 'extra': 1},
+    {'action': 'like', 'todo_id': 1, 'name': 'x'},
+    {'action': 'like', 'todo_id': 1, 'user': 1},
+    {'action': 'like', 'todo_id': 10 ** 30},
+    {'action': 'like', 'todo_id': str(10 ** 30)},
+    'like',
+])
+def test_malformed_operations_are_rejected(client, operation):
+    login(client, make_user('alice'))
+    db.session.commit()
+    response = client.post('/api/batch', json={'operations': [operation]})
+    assert response.status_code == 400
+    assert response.get_json()['index'] == 0
+
+
+def test_batch_applies_everything_or_nothing(client):
+    alice, bob = make_user('alice'), make_user('bob')
+    todo = make_todo(bob, 'done', completed=True)
+    db.session.commit()
+    login(client, alice)
+
+    response = client.post('/api/batch', json={'operations': [
+        {'action': 'like', 'todo_id': todo.id},
+        {'action': 'follow', 'username': 'nobody'},
+    ]})
+    assert (response.status_code, response.get_json()['index']) == (404, 1)
+    assert TodoReaction.query.count() == 0
+
+    response = client.post('/api/batch', json={'operations': [
+        {'action': 'like', 'todo_id': todo.id},
+        {'action': 'follow', 'username': 'bob'},
+    ]})
+    assert response.status_code == 200
+    assert [result['like_count'] for result in response.get_json()['results'][:1]] == [1]
+    assert User.query.get(bob.id).follower_count == 1
@@ -0,0 +1,30 @@
+import gzip
+import os
+from app.assets import asset_hash, compress_static
+
+
+def write(path, text):
+    with open(path, 'w') as f:
+        f.write(text)
+
+
+def get(client, filename):
+    return client.get(f'/static/{filename}?v={asset_hash(filename)}', headers={'Accept-Encoding': 'gzip'})
+
+
+def test_edited_asset_does_not_serve_its_old_compressed_copy(client, app, tmp_path, monkeypatch):
+    monkeypatch.setattr(app, 'static_folder', str(tmp_path))
+    write(tmp_path / 'style.css', 'body { color: red; }' * 20)
+    compress_static()
+    response = get(client, 'style.css')
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(response.data) == b'body { color: red; }' * 20
+
+    write(tmp_path / 'style.css', 'body { color: blue; }')
+    response = get(client, 'style.css')
+    assert 'Content-Encoding' not in response.headers
+    assert response.data == b'body { color: blue; }'
+
+    written = compress_static()
+    assert sorted(os.listdir(tmp_path)) == sorted(['style.css'] + [os.path.basename(path) for path in written])
+    assert gzip.decompress(get(client, 'style.css').data) == b'body { color: blue; }'
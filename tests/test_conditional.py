@@ -0,0 +1,30 @@
+from datetime import datetime
+from app import db
+from app.models import User
+from conftest import make_user, login
+
+
+def set_watermark(user, at):
+    db.session.execute(User.__table__.update().where(User.id == user.id).values(last_modified=at))
+    db.session.commit()
+
+
+def test_todo_page_answers_304_until_a_followed_author_changes(client):
+    viewer, author = make_user('viewer'), make_user('author')
+    viewer.follow(author)
+    db.session.commit()
+    set_watermark(viewer, datetime(2026, 1, 1, 12, 0, 0, 100000))
+    set_watermark(author, datetime(2026, 1, 1, 12, 0, 0, 200000))
+    login(client, viewer)
+
+    first = client.get('/todo')
+    assert first.status_code == 200
+    assert first.headers['Cache-Control'] == 'private, no-cache'
+    etag, last_modified = first.headers['ETag'], first.headers['Last-Modified']
+    assert client.get('/todo', headers={'If-None-Match': etag}).status_code == 304
+
+    # A change within the same second as the copy the client holds.
+    set_watermark(author, datetime(2026, 1, 1, 12, 0, 0, 700000))
+
+    assert client.get('/todo', headers={'If-None-Match': etag}).status_code == 200
+    assert client.get('/todo', headers={'If-Modified-Since': last_modified}).status_code == 200
@@ -0,0 +1,26 @@
+import json
+from app import db
+from app.data import import_rows, export_rows
+from app.models import User
+
+
+def test_import_keeps_fields_missing_from_earlier_records(app, tmp_path):
+    source = tmp_path / 'users.jsonl'
+    source.write_text('\n'.join(json.dumps(record) for record in [
+        {'id': 1, 'username': 'alice', 'first_name': 'Alice', 'last_name': 'A', 'email': 'a@example.com',
+         'password_hash': 'x'},
+        {'id': 2, 'username': 'bob', 'first_name': 'Bob', 'last_name': 'B', 'email': 'b@example.com',
+         'password_hash': 'x', 'bio': 'hello'},
+        {'id': 3, 'username': 'carol', 'first_name': 'Carol', 'last_name': 'C', 'email': 'c@example.com',
+         'password_hash': 'x'},
+    ]))
+
+    assert import_rows('users', str(source), chunk_size=100) == 3
+    db.session.commit()
+    assert [user.bio for user in User.query.order_by(User.id)] == [None, 'hello', None]
+    assert User.query.get(1).follower_count == 0
+
+    target = tmp_path / 'export.jsonl'
+    export_rows('users', str(target), chunk_size=2)
+    exported = [json.loads(line) for line in target.read_text().splitlines()]
+    assert exported[1]['bio'] == 'hello'
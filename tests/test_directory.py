@@ -0,0 +1,23 @@
+from app import db
+from app.directory import UserDirectory
+from conftest import make_user, QueryCounter
+
+
+def test_searches_are_cached_until_invalidated(app):
+    make_user('alice')
+    make_user('albert')
+    make_user('bob')
+    db.session.commit()
+    directory = UserDirectory(max_entries=1, ttl=60)
+
+    with QueryCounter(db.engine) as queries:
+        assert [entry.username for entry in directory.search('al', 10)] == ['albert', 'alice']
+        assert [entry.username for entry in directory.search('al', 10)] == ['albert', 'alice']
+    assert queries.count == 1
+
+    with QueryCounter(db.engine) as queries:
+        directory.search('b', 10)
+        directory.search('al', 10)
+        directory.invalidate()
+        directory.search('al', 10)
+    assert queries.count == 3
@@ -0,0 +1,58 @@
+from app import db
+from app.feed import get_feed_page
+from app.models import User
+from conftest import make_user, make_feed, make_todo, QueryCounter
+
+
+def read_all_pages(viewer, per_page):
+    pages, cursor = [], None
+    while True:
+        items, cursor = get_feed_page(viewer, cursor=cursor, per_page=per_page)
+        pages.append([item.todo.id for item in items])
+        if cursor is None:
+            return pages
+
+
+def test_pages_merge_pushed_and_pulled_authors_in_order(app):
+    viewer = make_user('viewer')
+    authors = [make_user(f'author{n}') for n in range(4)]
+    authors[0].fanout_on_read = True
+    authors[1].fanout_on_read = True
+    make_feed(viewer, authors, todos_per_author=5)
+    make_todo(viewer, 'own', completed=True)
+    db.session.commit()
+
+    pages = read_all_pages(User.query.get(viewer.id), per_page=3)
+    ids = [id for page in pages for id in page]
+
+    expected = [todo.id for todo in sorted(
+        (todo for user in authors + [viewer] for todo in user.todos),
+        key=lambda todo: (todo.completed_at, todo.id), reverse=True)]
+    assert ids == expected
+    assert all(len(page) == 3 for page in pages[:-1])
+
+
+def test_pulled_authors_are_skipped_when_none_are_followed(app):
+    viewer = make_user('viewer')
+    make_feed(viewer, [make_user('author')], todos_per_author=3)
+    db.session.commit()
+
+    with QueryCounter(db.engine) as queries:
+        get_feed_page(User.query.get(viewer.id), per_page=2)
+    assert not any('todo.user_id IN' in statement for statement in queries.statements)
+
+
+def test_each_source_is_limited_before_merging(app):
+    viewer = make_user('viewer')
+    author = make_user('author', fanout_on_read=True)
+    make_feed(viewer, [author, make_user('other')], todos_per_author=10)
+    db.session.commit()
+    _, cursor = get_feed_page(User.query.get(viewer.id), per_page=4)
+
+    with QueryCounter(db.engine) as queries:
+        items, _ = get_feed_page(User.query.get(viewer.id), cursor=cursor, per_page=4)
+    feed_queries = [statement for statement in queries.statements
+                    if 'FROM todo' in statement and 'completed_at <' in statement]
+    assert len(items) == 4
+    assert len(feed_queries) == 2
+    assert all('LIMIT' in statement and 'UNION' not in statement for statement in feed_queries)
@@ -0,0 +1,54 @@
+from datetime import datetime
+from app import app, db
+from app.fragments import fragments, MemoryBackend
+from app.models import User, Notification
+from conftest import make_user, make_todo, login
+
+
+def test_tag_reuses_fragment_until_version_changes(app, monkeypatch):
+    monkeypatch.setattr(fragments, 'backend', MemoryBackend(10))
+    template = app.jinja_env.from_string(
+        "{% cache ('greeting', 1), 60, version=version %}{{ name }}{% endcache %}")
+
+    assert template.render(name='first', version=1) == 'first'
+    assert template.render(name='second', version=1) == 'first'
+    assert template.render(name='third', version=2) == 'third'
+
+
+def test_nav_sees_notifications_written_by_another_process(client, monkeypatch):
+    monkeypatch.setattr(fragments, 'backend', MemoryBackend(10))
+    alice, bob = make_user('alice'), make_user('bob')
+    db.session.commit()
+    login(client, alice)
+    assert b"id='notification-badge'>1</span>" not in client.get('/todo').data
+
+    # What a job worker does: the rows change, but nothing reaches this
+    # process's memory backend.
+    db.session.add(Notification(user_id=alice.id, actor_id=bob.id, body='{actor_name} waved',
+                                rendered='Bob T waved', timestamp=datetime.utcnow()))
+    db.session.execute(User.__table__.update().where(User.id == alice.id)
+                       .values(unread_notifications=1, last_modified=datetime.utcnow()))
+    db.session.commit()
+
+    page = client.get('/todo').data
+    assert b"id='notification-badge'>1</span>" in page
+    assert b'Bob T waved' in page
+
+
+def test_feed_items_follow_the_authors_profile(app, monkeypatch):
+    monkeypatch.setattr(fragments, 'backend', MemoryBackend(10))
+    alice, bob = make_user('alice'), make_user('bob')
+    alice.follow(bob)
+    make_todo(bob, 'shipped it', completed=True)
+    db.session.commit()
+    reader, author = app.test_client(), app.test_client()
+    login(reader, alice)
+    login(author, bob)
+    assert b'/profile/bob' in reader.get('/feed').data
+
+    author.post('/edit-profile', data={'bio': '', 'first_name': 'Robert', 'last_name': 'Test',
+                                       'email': 'bob@example.com', 'username': 'robert'})
+
+    page = reader.get('/feed').data
+    assert b'/profile/robert' in page and b'/profile/bob' not in page
+    assert b'Robert T' in page
@@ -0,0 +1,26 @@
+import pytest
+from app.instrumentation import Instrumentation, EndpointStats
+
+
+def test_metrics_parse_as_four_families_with_every_sample():
+    parser = pytest.importorskip('prometheus_client.parser')
+    instrumentation = Instrumentation()
+    for endpoint, queries in (('todo', 12), ('profile', 3)):
+        stats = instrumentation.endpoints.setdefault(endpoint, EndpointStats())
+        stats.queries.observe(queries)
+        stats.db_time.observe(0.02)
+        stats.slowest_statement = 'SELECT "user".id\n  FROM "user" WHERE id = ?'
+        stats.slowest_duration = 0.015
+
+    families = {family.name: family for family in
+                parser.text_string_to_metric_families(instrumentation.render_metrics())}
+
+    assert {name: family.type for name, family in families.items()} == {
+        'sodo_db_queries_per_request': 'histogram',
+        'sodo_db_seconds_per_request': 'histogram',
+        'sodo_db_n_plus_one': 'counter',
+        'sodo_db_slowest_query_seconds': 'gauge',
+    }
+    assert all(family.samples for family in families.values())
+    slowest = families['sodo_db_slowest_query_seconds'].samples[0]
+    assert slowest.labels['statement'] == 'SELECT "user".id FROM "user" WHERE id = ?'
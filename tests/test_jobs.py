@@ -0,0 +1,95 @@
+from datetime import datetime, timedelta
+from app import app, db
+from flask import g
+from app.jobs import HANDLERS, enqueue, run_batch, run_batch_in_context, _claim, purge_done, defer_notification
+from app.models import Job, Notification, Timeline, User
+from conftest import make_user, login
+
+
+def test_actions_drain_into_timeline_and_notifications(client):
+    alice, bob = make_user('alice'), make_user('bob')
+    db.session.commit()
+    login(client, alice)
+
+    client.get('/follow/bob')
+    client.post('/todo', data={'title': 'Write tests', 'description': ''})
+    todo_id = User.query.get(alice.id).todos.first().id
+    client.get(f'/todo/{todo_id}/complete')
+    login(client, bob)
+    client.post(f'/api/todo/{todo_id}/like')
+
+    assert Job.query.filter_by(status='queued').count() == 5
+    while run_batch():
+        pass
+
+    assert Job.query.filter(Job.status != 'done').count() == 0
+    assert Timeline.query.filter_by(user_id=alice.id).count() == 3
+    assert Notification.query.filter_by(user_id=bob.id).count() == 1
+    assert Notification.query.filter_by(user_id=alice.id).count() == 1
+    assert User.query.get(alice.id).unread_notifications == 1
+
+
+def test_a_claimed_job_is_not_claimed_again(app):
+    enqueue('timeline', user_id=make_user('alice').id, body='x', timestamp=datetime.utcnow().isoformat())
+    db.session.commit()
+
+    _, first = _claim(10)
+    _, second = _claim(10)
+    assert len(first) == 1
+    assert second == []
+
+
+def test_an_expired_lease_is_reclaimed(app):
+    enqueue('timeline', user_id=make_user('alice').id, body='x', timestamp=datetime.utcnow().isoformat())
+    db.session.commit()
+    _claim(10)
+    Job.query.update({'run_at': datetime.utcnow() - timedelta(seconds=1)})
+    db.session.commit()
+
+    assert run_batch() == 1
+    job = Job.query.one()
+    assert (job.status, job.attempts) == ('done', 2)
+
+
+def test_failed_jobs_are_retried_then_given_up(app, monkeypatch):
+    def explode(**payload):
+        raise RuntimeError('boom')
+
+    monkeypatch.setitem(HANDLERS, 'explode', explode)
+    enqueue('explode')
+    db.session.commit()
+
+    for attempt in range(1, app.config['JOB_MAX_ATTEMPTS'] + 1):
+        assert run_batch() == 1
+        job = Job.query.one()
+        assert job.attempts == attempt
+        Job.query.update({'run_at': datetime.utcnow()})
+        db.session.commit()
+    assert (job.status, job.error) == ('failed', 'boom')
+    assert run_batch() == 0
+
+
+def test_purge_frees_idempotency_keys(app):
+    enqueue('timeline', key='follow:1:2', user_id=make_user('alice').id, body='x',
+            timestamp=datetime.utcnow().isoformat())
+    db.session.commit()
+    run_batch()
+    Job.query.update({'created_at': datetime.utcnow() - timedelta(hours=app.config['JOB_RETENTION_HOURS'] + 1)})
+    db.session.commit()
+
+    purge_done()
+    assert enqueue('timeline', key='follow:1:2', user_id=1, body='x', timestamp=datetime.utcnow().isoformat())
+
+
+def test_worker_batches_leave_no_users_or_session_state_behind(app):
+    alice = make_user('alice')
+    for n in range(3):
+        defer_notification(alice, make_user(f'actor{n}'), '{actor_name} waved')
+    db.session.commit()
+    alice_id = alice.id
+    g.pop('users', None)
+
+    assert run_batch_in_context()
+    assert g.get('users', {}) == {}
+    assert len(db.session.identity_map) == 0
+    assert Notification.query.filter_by(user_id=alice_id).count() == 3
@@ -0,0 +1,33 @@
+from app import db
+from app.models import Notification, User
+from conftest import make_user, login, QueryCounter
+
+
+def add_legacy_notification(user, actor):
+    # Rows from before bodies were rendered on write.
+    db.session.add(Notification(user_id=user.id, actor_id=actor.id, body='{actor_name} waved'))
+    db.session.commit()
+
+
+def test_legacy_notifications_render_without_writing(app):
+    alice, bob = make_user('alice'), make_user('bob')
+    add_legacy_notification(alice, bob)
+
+    with QueryCounter(db.engine) as queries:
+        notifications = User.query.get(alice.id).get_notifications()
+        assert [notification.get_data() for notification in notifications] == [bob.get_formatted_name() + ' waved']
+        assert not db.session.dirty
+        db.session.commit()
+    assert not any(statement.startswith('UPDATE') for statement in queries.statements)
+    assert Notification.query.one().rendered is None
+
+
+def test_todo_page_shows_legacy_notifications_without_updates(client):
+    alice, bob = make_user('alice'), make_user('bob')
+    add_legacy_notification(alice, bob)
+    login(client, alice)
+
+    with QueryCounter(db.engine) as queries:
+        response = client.get('/todo')
+    assert bob.get_formatted_name() + ' waved' in response.get_data(as_text=True)
+    assert not any(statement.startswith('UPDATE') for statement in queries.statements)
@@ -0,0 +1,57 @@
+from sqlalchemy import event
+from app import db
+from app.models import Todo, User
+from conftest import make_user, make_todo, login, QueryCounter
+
+
+class TodoLoads(object):
+
+    def __init__(self):
+        self.loaded = []
+
+    def _record(self, target, context):
+        self.loaded.append(target)
+
+    def __enter__(self):
+        event.listen(Todo, 'load', self._record)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(Todo, 'load', self._record)
+
+
+def make_pending(viewer, others, count):
+    for n in range(count):
+        make_todo(viewer, f'mine {n}')
+        for other in others:
+            make_todo(other, f'{other.username} {n}')
+    db.session.commit()
+
+
+def test_pending_todos_are_rows_bounded_by_the_limit(app):
+    viewer = make_user('viewer')
+    make_pending(viewer, [make_user('other')], count=5)
+
+    with TodoLoads() as todos, QueryCounter(db.engine) as queries:
+        pending = User.query.get(viewer.id).get_pending_todos(limit=3)
+    assert [row.title for row in pending] == ['mine 0', 'mine 1', 'mine 2']
+    assert not any(isinstance(row, Todo) for row in pending)
+    assert todos.loaded == []
+    assert 'LIMIT' in queries.statements[-1]
+
+
+def test_todo_page_hydrates_no_pending_todos(app, client, monkeypatch):
+    monkeypatch.setitem(app.config, 'PENDING_TODO_LIMIT', 3)
+    viewer = make_user('viewer')
+    others = [make_user(f'other{n}') for n in range(3)]
+    for other in others:
+        viewer.follow(other)
+        make_todo(other, 'shared', completed=True)
+    make_pending(viewer, others, count=5)
+    login(client, viewer)
+
+    with TodoLoads() as todos:
+        response = client.get('/todo')
+    assert response.status_code == 200
+    assert response.get_data(as_text=True).count('mine ') == 3
+    assert todos.loaded and all(todo.completed for todo in todos.loaded)
@@ -0,0 +1,39 @@
+from app import app, db
+from app.models import TodoReaction, user_cache
+from conftest import make_user, make_todo, make_feed, login, QueryCounter
+
+# Statements a cold GET /todo may issue however large the feed is: loading
+# the current user, the watermark, the pushed and pulled feed branches and
+# the pulled authors, the feed's authors, the viewer's likes on the page, the
+# pending todos and the notifications.
+TODO_PAGE_QUERIES = 9
+
+
+def count_todo_page_queries(client, feed_size):
+    viewer = make_user(f'viewer{feed_size}')
+    authors = [make_user(f'author{feed_size}_{n}') for n in range(4)]
+    authors[0].fanout_on_read = True
+    make_feed(viewer, authors, todos_per_author=feed_size // len(authors))
+    for author in authors:
+        make_todo(author, 'pending')
+        for todo in author.todos[::2]:
+            if todo.completed:
+                db.session.add(TodoReaction(user_id=viewer.id, todo_id=todo.id))
+    make_todo(viewer, 'own pending')
+    db.session.commit()
+    login(client, viewer)
+
+    # The fixture's app context would otherwise carry g and the session's
+    # identity map into the request, hiding the queries a cold one makes.
+    db.session.remove()
+    user_cache.clear()
+    with app.app_context(), QueryCounter(db.engine) as queries:
+        response = client.get('/todo')
+    assert response.status_code == 200
+    return queries.count
+
+
+def test_todo_page_query_count_does_not_grow_with_feed(client):
+    counts = [count_todo_page_queries(client, size) for size in (0, 4, 20, 40)]
+    assert max(counts) <= TODO_PAGE_QUERIES
+    assert len(set(counts[1:])) == 1, counts
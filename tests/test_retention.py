@@ -0,0 +1,28 @@
+from datetime import datetime, timedelta
+from app import db
+from app.models import Timeline
+from app.retention import compact
+from conftest import make_user
+
+
+def test_compaction_keeps_recent_rows_and_each_users_latest(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'TIMELINE_RETENTION_DAYS', 30)
+    monkeypatch.setitem(app.config, 'RETENTION_KEEP_LATEST', 3)
+    monkeypatch.setitem(app.config, 'RETENTION_BATCH_SIZE', 4)
+    now = datetime.utcnow()
+    old = now - timedelta(days=40)
+    heavy, light, mixed = make_user('heavy'), make_user('light'), make_user('mixed')
+    for n in range(10):
+        db.session.add(Timeline(user=heavy, body=f'heavy {n}', timestamp=old + timedelta(minutes=n)))
+    for n in range(2):
+        db.session.add(Timeline(user=light, body=f'light {n}', timestamp=old + timedelta(minutes=n)))
+    # Ties on the keep_latest-th newest row are kept with it.
+    for n in range(4):
+        db.session.add(Timeline(user=mixed, body=f'mixed old {n}', timestamp=old))
+    db.session.add(Timeline(user=mixed, body='mixed new', timestamp=now))
+    db.session.commit()
+
+    assert compact('timeline') == 7
+    assert sorted(row.body for row in Timeline.query) == sorted(
+        [f'heavy {n}' for n in (7, 8, 9)] + ['light 0', 'light 1'] +
+        [f'mixed old {n}' for n in range(4)] + ['mixed new'])